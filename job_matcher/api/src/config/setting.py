@@ -8,3 +8,28 @@ class Settings(BaseSettings):
     DOMAIN: str = "0.0.0.0"
     BACKEND_PORT: int = 8080
     DEBUG_MODE: bool = True
+    MIN_SKILL_OVERLAP: int = 1
+    LSH_CONTAINMENT: float = 0.3
+    INDEX_PATH: str = "static/job_index.bin"
+    SHARED_INDEX: bool = False
+    SHARED_INDEX_DIR: str = "/dev/shm"
+    SHARED_INDEX_NAME: str = "job_matcher_index"
+    ADMIN_TOKEN: str = ""
+    CV_CACHE_SIZE: int = 256
+    CV_CACHE_DIR: str = ""
+    CV_CACHE_DISK_BYTES: int = 268435456
+    WORKER_PROCESSES: int = 2
+    TASK_TIMEOUT: float = 60
+    METRICS_DIR: str = ""
+    PROFILE_DIR: str = "/tmp/job_matcher_profiles"
+    PROFILE_KEEP: int = 50
+    PROFILE_SAMPLE_RATE: float = 0
+    BATCH_MAX_FILES: int = 500
+    BATCH_MAX_BYTES: int = 209715200
+    BATCH_CONCURRENCY: int = 16
+    PDF_MAX_PAGES: int = 50
+    PDF_MAX_BYTES: int = 20971520
+    DOCX_MAX_BYTES: int = 10485760
+    TXT_MAX_BYTES: int = 1048576
+    PDF_TIME_BUDGET: float = 10
+    PDF_PROCESSES: int = 0
@@ -1 +1,2 @@
 from .user import router
+from .admin import router as admin_router
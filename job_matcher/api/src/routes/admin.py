@@ -0,0 +1,49 @@
+from typing import Literal
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import FileResponse, PlainTextResponse
+from schemas import JobChanges, ProfilingChange
+from .auth import require_admin
+from .user import cv_matcher, profiler
+
+
+router = APIRouter(
+    prefix="/admin",
+    tags=["Admin"],
+    dependencies=[Depends(require_admin)]
+)
+
+@router.post("/jobs")
+def update_jobs(changes: JobChanges):
+    if not changes.upsert and not changes.delete:
+        raise HTTPException(status_code=400, detail="Nothing to upsert or delete.")
+    upserts = [job.model_dump() for job in changes.upsert]
+    deletes = [(key.title, key.governorate, key.level) for key in changes.delete]
+    try:
+        return cv_matcher.apply_changes(upserts, deletes)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/cache")
+def cache_stats():
+    return cv_matcher.cache.stats()
+
+@router.get("/profiles")
+def list_profiles():
+    return {"sample_rate": profiler.rate(), "keep": profiler.keep, "profiles": profiler.entries()}
+
+@router.put("/profiling")
+def set_profiling(change: ProfilingChange):
+    try:
+        profiler.set_rate(change.sample_rate)
+    except OSError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return list_profiles()
+
+@router.get("/profiles/{profile_id}")
+def get_profile(profile_id: str, format: Literal["pstats", "text"] = "pstats"):
+    path = profiler.path(profile_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail=f"No profile {profile_id}.")
+    if format == "text":
+        return PlainTextResponse(profiler.text(profile_id))
+    return FileResponse(path, media_type="application/octet-stream", filename=profile_id)
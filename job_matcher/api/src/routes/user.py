@@ -1,22 +1,133 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException
+import asyncio
+import json
+import tempfile
+import threading
+from typing import List, Literal
+from fastapi import APIRouter, UploadFile, File, Form, Header, HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, StreamingResponse
 from services import CVMatcher
+from services.main import ERRORS, SERIALIZATION
+from services import metrics
+from services.cv_cache import CVCache
+from services.pool import WorkerPool
+from services.profiling import Profiler
+from services.uploads import expand_uploads
+from services.upload_limits import check_upload
+from config import settings
+from .auth import is_admin
 
 router = APIRouter(
     prefix="/cv",
     tags=["CV Matching"]
 )
 
-cv_matcher = CVMatcher()
+# Metrics are kept in files, so those of the worker processes (started below) count too, and
+# server workers sharing METRICS_DIR report each other's
+metrics.use_directory(settings.METRICS_DIR or tempfile.mkdtemp(prefix="job_matcher_metrics-"))
+
+cv_cache = CVCache(settings.CV_CACHE_SIZE, settings.CV_CACHE_DIR or None, settings.CV_CACHE_DISK_BYTES)
+profiler = Profiler(settings.PROFILE_DIR, settings.PROFILE_KEEP, settings.PROFILE_SAMPLE_RATE)
+
+upload_limits = {"pdf": settings.PDF_MAX_BYTES, "docx": settings.DOCX_MAX_BYTES, "txt": settings.TXT_MAX_BYTES}
+
+# With a worker pool the CVs are read in its workers, which cannot start processes to spread pages over
+pdf_options = {
+    "pdf_max_pages": settings.PDF_MAX_PAGES, "pdf_max_bytes": settings.PDF_MAX_BYTES,
+    "pdf_budget": settings.PDF_TIME_BUDGET, "pdf_processes": 0 if settings.WORKER_PROCESSES else settings.PDF_PROCESSES,
+}
+
+if settings.SHARED_INDEX:
+    cv_matcher = CVMatcher.shared(
+        settings.SHARED_INDEX_DIR, settings.SHARED_INDEX_NAME,
+        index_path=settings.INDEX_PATH, min_overlap=settings.MIN_SKILL_OVERLAP, cache=cv_cache, lsh_containment=settings.LSH_CONTAINMENT, **pdf_options,
+    )
+else:
+    cv_matcher = CVMatcher(min_overlap=settings.MIN_SKILL_OVERLAP, index_path=settings.INDEX_PATH, cache=cv_cache, lsh_containment=settings.LSH_CONTAINMENT, **pdf_options)
+
+worker_pool = None
+if settings.WORKER_PROCESSES:
+    worker_pool = WorkerPool(settings.WORKER_PROCESSES, CVMatcher.worker, (cv_matcher.worker_args(),))
+    worker_pool.start()
+
+warmed = threading.Event()
+
+def warm_up():
+    # Batches are scored in this process even when the CVs are read in the pool
+    try:
+        cv_matcher.warm_up()
+    except Exception as e:
+        print(f"Warning: Warm-up failed: {e}")
+        return
+    warmed.set()
+
+def is_ready():
+    """Whether the jobs are loaded and warm here and in every pool worker."""
+    return warmed.is_set() and (worker_pool is None or worker_pool.ready())
 
 @router.post("/inference")
-async def match_cv(file: UploadFile = File(...)):
+async def match_cv(
+    file: UploadFile = File(...),
+    top_k: int = Form(3, ge=1),
+    scoring: Literal["cosine", "tfidf"] = Form("cosine"),
+    search: Literal["exact", "lsh"] = Form("exact"),
+    x_profile: bool = Header(False),
+    x_admin_token: str = Header(None),
+):
     if not file.filename.endswith(".pdf"):
+        ERRORS.inc("unsupported_file")
         raise HTTPException(status_code=400, detail="Only PDF files are supported.")
+    problem = check_upload(file, upload_limits)
+    if problem:
+        ERRORS.inc("unsupported_file")
+        status, detail = problem
+        raise HTTPException(status_code=status, detail=detail)
+    if x_profile and not is_admin(x_admin_token):
+        raise HTTPException(status_code=403, detail="Profiling a request needs a valid X-Admin-Token header.")
 
+    profile = profiler.capture(x_profile)
+    headers = {}
     try:
-        file_bytes = await file.read()
-        result = cv_matcher.run_inference(file_bytes)
-        return result
-
+        try:
+            result = await cv_matcher.process_upload(file, worker_pool, settings.TASK_TIMEOUT or None, top_k=top_k, scoring=scoring, search=search, profile=profile)
+        finally:
+            # Failed and timed-out requests, often the ones worth profiling, get their id too
+            if profile is not None:
+                profile_id = await asyncio.get_running_loop().run_in_executor(None, profiler.save, profile)
+                if profile_id:
+                    headers["X-Profile-Id"] = profile_id
+        if "error" in result:
+            ERRORS.inc("rejected")
+            raise HTTPException(status_code=400, detail=result["error"], headers=headers)
+        with SERIALIZATION.time():
+            return JSONResponse(jsonable_encoder(result), headers=headers)
+    except asyncio.TimeoutError:
+        ERRORS.inc("timeout")
+        raise HTTPException(status_code=504, detail="Timed out processing the CV.", headers=headers)
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        ERRORS.inc("internal")
+        raise HTTPException(status_code=500, detail=str(e), headers=headers)
+
+@router.post("/batch")
+async def match_batch(
+    files: List[UploadFile] = File(...),
+    top_k: int = Form(3, ge=1),
+    scoring: Literal["cosine", "tfidf"] = Form("cosine"),
+    search: Literal["exact", "lsh"] = Form("exact"),
+):
+    """Match many CVs (or .zip files of them) at once; one JSON line per CV, in the order they finish."""
+    try:
+        uploads = expand_uploads(files, settings.BATCH_MAX_FILES, upload_limits)
+    except ValueError as e:
+        ERRORS.inc("bad_batch")
+        raise HTTPException(status_code=400, detail=str(e))
+
+    async def lines():
+        async for filename, result in cv_matcher.process_batch(uploads, worker_pool, settings.TASK_TIMEOUT or None, top_k=top_k, scoring=scoring, search=search, concurrency=settings.BATCH_CONCURRENCY):
+            with SERIALIZATION.time():
+                line = json.dumps({"file": filename, **result}) + "\n"
+            yield line
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
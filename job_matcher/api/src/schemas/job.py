@@ -0,0 +1,17 @@
+from typing import List
+from pydantic import BaseModel, Field
+
+
+class JobKey(BaseModel):
+    title: str = Field(..., min_length=1)
+    governorate: str = Field(..., min_length=1)
+    level: str = Field(..., min_length=1)
+
+
+class JobIn(JobKey):
+    skills: List[str]
+
+
+class JobChanges(BaseModel):
+    upsert: List[JobIn] = []
+    delete: List[JobKey] = []
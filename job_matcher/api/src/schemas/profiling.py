@@ -0,0 +1,7 @@
+from typing import Optional
+from pydantic import BaseModel, Field
+
+
+class ProfilingChange(BaseModel):
+    # None goes back to PROFILE_SAMPLE_RATE
+    sample_rate: Optional[float] = Field(..., ge=0, le=1)
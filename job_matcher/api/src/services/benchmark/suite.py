@@ -0,0 +1,87 @@
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+from ..main import CVMatcher
+from ..cv_cache import CVCache
+from ..index import SCORING_MODES, SEARCH_MODES
+from ..pool import Upload
+from . import stats, synthetic
+
+
+def run_scale(scale, path, cvs, repeat, top_k, scoring, search):
+    """Timings of every stage of matching `cvs` against the jobs in `path`."""
+    # No cache, so every repeat reads and extracts the CV again
+    matcher, load = stats.measured(CVMatcher, data_path=path, cache=CVCache(0))
+    snapshot = matcher.snapshot
+    stages = stats.Stages()
+    for i in range(repeat + 1):
+        if i == 1:
+            # The first pass warms up imports and lazily built tables
+            stages = stats.Stages()
+        for name, content in cvs:
+            fmt = name.rsplit(".", 1)[-1]
+            text, error = stages.run("read." + fmt, matcher.extract_text_from_cv, Upload(name, content))
+            if error:
+                raise RuntimeError(f"{name}: {error}")
+            skill_ids = stages.run("extract_skills", matcher.skill_ids, text, snapshot)
+            user_skills = [snapshot.extractor.skills[skill] for skill in skill_ids]
+            stages.run("rank", matcher.rank, user_skills, snapshot, top_k, scoring=scoring, search=search)
+            stages.run("process_cv", matcher.process_cv, Upload(name, content), top_k, scoring=scoring, search=search)
+    return {
+        "scale": scale,
+        "jobs": matcher.catalog.live_count(),
+        "skills": len(matcher.catalog.skills),
+        "groups": int(matcher.index.alive.sum()),
+        "load": load,
+        "stages": stages.report(),
+        "peak_rss_bytes": stats.peak_rss(),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark reading, skill extraction and ranking of CVs against synthetic job catalogues.")
+    parser.add_argument("--data", default=os.path.join("static", "job_data.csv"), help="catalogue the synthetic ones imitate")
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 10, 100], help="catalogue sizes, in multiples of --data")
+    parser.add_argument("--cvs", type=int, default=24, help="synthetic CVs, spread over formats and lengths")
+    parser.add_argument("--repeat", type=int, default=3, help="timed passes over the CVs, after one warm-up pass")
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--scoring", choices=SCORING_MODES, default="cosine")
+    parser.add_argument("--search", choices=SEARCH_MODES, default="exact")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workdir", help="keep the synthetic catalogues here and reuse them on the next run")
+    parser.add_argument("--output", help="JSON report file (default: stdout)")
+    parser.add_argument("--baseline", help="earlier JSON report to compare the medians with")
+    args = parser.parse_args(argv)
+
+    catalog = synthetic.source_catalog(args.data)
+    cvs = synthetic.synthetic_cvs(catalog, args.cvs, seed=args.seed)
+    workdir = args.workdir or tempfile.mkdtemp(prefix="job-matcher-bench-")
+    os.makedirs(workdir, exist_ok=True)
+    report = {
+        "service": "job_matcher",
+        "environment": stats.environment(),
+        "settings": {
+            "cvs": args.cvs, "repeat": args.repeat, "top_k": args.top_k,
+            "scoring": args.scoring, "search": args.search, "seed": args.seed,
+        },
+        "scales": [],
+    }
+    try:
+        for scale in args.scales:
+            path = os.path.join(workdir, f"jobs_{scale}x_seed{args.seed}.csv")
+            if not os.path.exists(path):
+                synthetic.write_jobs(catalog, scale, path, args.seed)
+            print(f"Scale {scale}x...", file=sys.stderr)
+            report["scales"].append(stats.isolated(run_scale, scale, path, cvs, args.repeat, args.top_k, args.scoring, args.search))
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    stats.write_report(report, args.output)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        print("\n".join(stats.compare(baseline, report)), file=sys.stderr)
@@ -0,0 +1,349 @@
+import re
+import numpy as np
+from scipy import sparse
+from .artifact import StringIndex
+from .lsh import MinHashLSH, token_hash
+
+# Same tokenization as sklearn's CountVectorizer defaults (lowercase + token_pattern)
+TOKEN_PATTERN = re.compile(r"(?u)\b\w\w+\b")
+SCORING_MODES = ("cosine", "tfidf")
+SEARCH_MODES = ("exact", "lsh")
+
+
+def tokenize(skills):
+    return TOKEN_PATTERN.findall(' '.join(skills).lower())
+
+
+def normalized_rows(group_skills, tokens):
+    """L2-normalised token-count rows for `group_skills` and their norms.
+
+    New tokens are added to `tokens`; the matrix has one column per token in it.
+    """
+    indptr = [0]
+    indices = []
+    data = []
+    for skills in group_skills:
+        counts = {}
+        for token in tokenize(skills):
+            column = tokens.setdefault(token, len(tokens))
+            counts[column] = counts.get(column, 0) + 1
+        indices.extend(counts.keys())
+        data.extend(counts.values())
+        indptr.append(len(indices))
+
+    counts = sparse.csr_matrix(
+        (np.asarray(data, dtype=np.float64), np.asarray(indices, dtype=np.int32), np.asarray(indptr, dtype=np.int64)),
+        shape=(len(group_skills), len(tokens)),
+    )
+    norms = np.sqrt(np.asarray(counts.multiply(counts).sum(axis=1)).ravel())
+    scale = np.divide(1.0, norms, out=np.zeros_like(norms), where=norms > 0)
+    return sparse.diags(scale).dot(counts).tocsr(), norms
+
+
+def inverse_document_frequencies(matrix, alive):
+    """Smoothed idf of every token over the live groups, as TfidfVectorizer computes it."""
+    live = matrix[np.flatnonzero(alive)]
+    df = np.bincount(live.indices, minlength=matrix.shape[1])
+    return np.log((1 + live.shape[0]) / (1 + df)) + 1
+
+
+def weighted_rows(matrix, idf):
+    """`matrix` with every entry scaled by its token's idf and the rows L2-normalised again.
+
+    The result shares the sparsity pattern, so only its data array is new.
+    """
+    rows = np.repeat(np.arange(matrix.shape[0]), np.diff(matrix.indptr))
+    data = matrix.data * idf[matrix.indices]
+    norms = np.sqrt(np.bincount(rows, weights=data * data, minlength=matrix.shape[0]))
+    data /= np.where(norms > 0, norms, 1.0)[rows]
+    return sparse.csr_matrix((data, matrix.indices, matrix.indptr), shape=matrix.shape, copy=False)
+
+
+def token_hashes(tokens):
+    """`token_hash` of each of `tokens`, a list of str or a `StringIndex` (in id order)."""
+    strings = tokens.strings if isinstance(tokens, StringIndex) else tokens
+    return np.fromiter((token_hash(token) for token in strings), dtype=np.int64, count=len(strings))
+
+
+def as_dict(mapping):
+    """Mutable str -> id copy of a dict or `StringIndex`."""
+    if isinstance(mapping, StringIndex):
+        return {key: i for i, key in enumerate(mapping.strings)}
+    return dict(mapping)
+
+
+class JobIndex:
+    """CSR job x skill-token count matrix, built once from the job skill lists.
+
+    Jobs listing exactly the same skills always get the same score and the same
+    matched/missing breakdown, so they are collapsed into one group up front and
+    the matrix has one row per group; `representatives` holds the first live job
+    row of each group and `job_groups` the group of every job row.
+
+    Scoring a CV against every group is a single sparse matrix-vector product over
+    the L2-normalised rows, which gives the same cosine values as fitting a
+    CountVectorizer per (cv, job) pair. An inverted skill -> group index narrows
+    the rows that need scoring to the groups sharing skills with the CV.
+
+    With `scoring="tfidf"` the counts on both sides are first weighted by the
+    token's idf over the groups, so tokens nearly every job lists ("it",
+    "development") count for little next to specific ones. The idf and the
+    weighted rows are computed with the index and stored next to the counts, so
+    this mode costs the same product.
+
+    For catalogues too big to score every group sharing a skill, `lsh_candidates`
+    finds the groups likely to hold most of the CV's tokens through a MinHash-LSH
+    index (see `MinHashLSH`), for exact scoring of those alone. It hashes the
+    tokens themselves, so an updated index finds the same groups a rebuilt one would.
+
+    `updated` returns a new index for a changed catalog: only new groups are
+    tokenized and appended, and groups left without live jobs are masked out by
+    `alive`. Existing arrays are never written to, so readers of the old index are
+    unaffected.
+    """
+
+    def __init__(self, job_skills, ignore=()):
+        self.ignore = set(ignore)
+        self.group_ids = {}
+        representatives = []
+        job_groups = []
+        for row, skills in enumerate(job_skills):
+            key = tuple(sorted(skills))
+            if key not in self.group_ids:
+                self.group_ids[key] = len(representatives)
+                representatives.append(row)
+            job_groups.append(self.group_ids[key])
+        self.representatives = np.asarray(representatives, dtype=np.int32)
+        self.job_groups = np.asarray(job_groups, dtype=np.int32)
+        self.alive = np.ones(len(representatives), dtype=bool)
+        group_skills = [job_skills[row] for row in representatives]
+
+        self.build_postings(group_skills, self.ignore)
+        self.tokens = {}
+        self.matrix, self.norms = normalized_rows(group_skills, self.tokens)
+        self.idf = inverse_document_frequencies(self.matrix, self.alive)
+        self.weighted = weighted_rows(self.matrix, self.idf)
+        self.token_hashes = token_hashes(list(self.tokens))
+        self.lsh = MinHashLSH.build(self.matrix.indptr, self.token_hashes[self.matrix.indices])
+
+    @classmethod
+    def from_artifact(cls, artifact, ignore=()):
+        index = cls.__new__(cls)
+        index.ignore = set(ignore)
+        index.group_ids = None
+        index.representatives = artifact.array("index.representatives")
+        index.job_groups = artifact.array("index.job_groups")
+        index.alive = artifact.array("index.alive")
+        index.skill_ids = StringIndex.from_artifact(artifact, "index.postings_skills")
+        index.postings_indptr = artifact.array("index.postings_indptr")
+        index.postings = artifact.array("index.postings")
+        index.tokens = StringIndex.from_artifact(artifact, "index.tokens")
+        index.norms = artifact.array("index.norms")
+        index.matrix = sparse.csr_matrix(
+            (artifact.array("index.matrix_data"), artifact.array("index.matrix_indices"), artifact.array("index.matrix_indptr")),
+            shape=(len(index.representatives), len(index.tokens)),
+            copy=False,
+        )
+        if "index.idf" in artifact:
+            index.idf = artifact.array("index.idf")
+            index.weighted = sparse.csr_matrix(
+                (artifact.array("index.weighted_data"), index.matrix.indices, index.matrix.indptr),
+                shape=index.matrix.shape,
+                copy=False,
+            )
+        else:
+            index.idf = inverse_document_frequencies(index.matrix, index.alive)
+            index.weighted = weighted_rows(index.matrix, index.idf)
+        index.token_hashes = artifact.array("index.token_hashes") if "index.token_hashes" in artifact else token_hashes(index.tokens)
+        if "lsh.minhashes" in artifact:
+            index.lsh = MinHashLSH.from_artifact(artifact)
+        else:
+            index.lsh = MinHashLSH.build(index.matrix.indptr, index.token_hashes[index.matrix.indices])
+        return index
+
+    def to_arrays(self):
+        return {
+            "index.representatives": self.representatives,
+            "index.job_groups": self.job_groups,
+            "index.alive": self.alive,
+            **StringIndex.arrays("index.postings_skills", self.skill_ids),
+            "index.postings_indptr": self.postings_indptr,
+            "index.postings": self.postings,
+            **StringIndex.arrays("index.tokens", self.tokens),
+            "index.norms": self.norms,
+            "index.matrix_data": self.matrix.data,
+            "index.matrix_indices": self.matrix.indices,
+            "index.matrix_indptr": self.matrix.indptr,
+            "index.idf": self.idf,
+            "index.weighted_data": self.weighted.data,
+            "index.token_hashes": self.token_hashes,
+            **self.lsh.to_arrays(),
+        }
+
+    def build_postings(self, job_skills, ignore):
+        self.skill_ids = {}
+        postings = []
+        for row, skills in enumerate(job_skills):
+            for skill in set(s.lower() for s in skills):
+                if skill in ignore:
+                    continue
+                skill_id = self.skill_ids.setdefault(skill, len(self.skill_ids))
+                if skill_id == len(postings):
+                    postings.append([])
+                postings[skill_id].append(row)
+        self.postings_indptr = np.zeros(len(postings) + 1, dtype=np.int64)
+        self.postings_indptr[1:] = np.cumsum([len(rows) for rows in postings])
+        self.postings = np.fromiter((row for rows in postings for row in rows), dtype=np.int32, count=self.postings_indptr[-1])
+
+    def updated(self, catalog, changes):
+        """Index over `catalog`, the result of `JobCatalog.updated` with `changes`."""
+        if self.group_ids is None:
+            self.group_ids = {tuple(sorted(catalog.skills_of(row))): g for g, row in enumerate(self.representatives.tolist())}
+        index = JobIndex.__new__(JobIndex)
+        index.ignore = self.ignore
+        index.group_ids = dict(self.group_ids)
+        added = changes["added"].tolist()
+        new_groups = []
+        job_groups = []
+        for row in added:
+            skills = catalog.skills_of(row)
+            key = tuple(sorted(skills))
+            if key not in index.group_ids:
+                index.group_ids[key] = len(self.representatives) + len(new_groups)
+                new_groups.append(skills)
+            job_groups.append(index.group_ids[key])
+        index.job_groups = np.concatenate([self.job_groups, np.asarray(job_groups, dtype=np.int32)])
+
+        groups = len(self.representatives) + len(new_groups)
+        live_rows = np.flatnonzero(catalog.live)
+        first = np.full(groups, len(catalog), dtype=np.int64)
+        np.minimum.at(first, index.job_groups[live_rows], live_rows)
+        index.alive = first < len(catalog)
+        # Groups without live jobs keep their last representative so they can be revived
+        previous = np.concatenate([self.representatives, np.zeros(len(new_groups), dtype=np.int32)])
+        index.representatives = np.where(index.alive, first, previous).astype(np.int32)
+
+        index.skill_ids = as_dict(self.skill_ids)
+        pairs = []
+        for offset, skills in enumerate(new_groups):
+            for skill in set(s.lower() for s in skills):
+                if skill not in self.ignore:
+                    pairs.append((index.skill_ids.setdefault(skill, len(index.skill_ids)), len(self.representatives) + offset))
+        pairs = np.asarray(sorted(pairs), dtype=np.int64).reshape(-1, 2)
+        indptr = np.concatenate([
+            self.postings_indptr,
+            np.full(len(index.skill_ids) + 1 - len(self.postings_indptr), self.postings_indptr[-1], dtype=np.int64),
+        ])
+        # New groups come after every existing one, so they go at the end of each posting list
+        index.postings = np.insert(self.postings, indptr[pairs[:, 0] + 1], pairs[:, 1].astype(np.int32))
+        index.postings_indptr = indptr
+        index.postings_indptr[1:] += np.cumsum(np.bincount(pairs[:, 0], minlength=len(index.skill_ids)))
+
+        index.tokens = as_dict(self.tokens)
+        rows, norms = normalized_rows(new_groups, index.tokens)
+        index.token_hashes = np.concatenate([self.token_hashes, token_hashes(list(index.tokens)[len(self.token_hashes):])])
+        matrix = sparse.csr_matrix((self.matrix.data, self.matrix.indices, self.matrix.indptr), shape=(self.matrix.shape[0], len(index.tokens)))
+        index.matrix = sparse.vstack([matrix, rows], format="csr")
+        index.norms = np.concatenate([self.norms, norms])
+        index.idf = inverse_document_frequencies(index.matrix, index.alive)
+        index.weighted = weighted_rows(index.matrix, index.idf)
+        index.lsh = self.lsh.extended(rows.indptr, index.token_hashes[rows.indices], len(self.representatives))
+        return index
+
+    def candidates(self, user_skills, min_overlap=1):
+        """Live groups sharing at least `min_overlap` distinct skills with the CV (every live group when 0)."""
+        if min_overlap <= 0:
+            return np.flatnonzero(self.alive).astype(np.int32)
+        skill_ids = {self.skill_ids.get(s.lower()) for s in user_skills} - {None}
+        if not skill_ids:
+            return np.empty(0, dtype=np.int32)
+        rows = np.concatenate([self.postings[self.postings_indptr[i]:self.postings_indptr[i + 1]] for i in skill_ids])
+        if min_overlap == 1:
+            rows = np.unique(rows)
+        else:
+            rows, overlap = np.unique(rows, return_counts=True)
+            rows = rows[overlap >= min_overlap]
+        return rows[self.alive[rows]]
+
+    def lsh_candidates(self, user_skills, containment=None):
+        """Live groups the LSH index finds likely to hold `containment` of the CV's tokens."""
+        hashes = token_hashes(sorted(set(tokenize(user_skills))))
+        groups = self.lsh.candidates(hashes, np.diff(self.matrix.indptr), containment)
+        return groups[self.alive[groups]]
+
+    def scored_matrix(self, scoring="cosine"):
+        if scoring not in SCORING_MODES:
+            raise ValueError(f"Unknown scoring {scoring!r}, expected one of {', '.join(SCORING_MODES)}")
+        return self.weighted if scoring == "tfidf" else self.matrix
+
+    def query_matrix(self, skill_lists, scoring="cosine"):
+        """CSR of the L2-normalised query vectors for each list of skills, one row each.
+
+        A CV's tokens that no job has still count towards its norm (with the
+        highest idf when weighting), as they would in a vectorizer fitted on both.
+        """
+        unseen = np.log(1 + int(self.alive.sum())) + 1
+        indptr = [0]
+        indices = []
+        data = []
+        for user_skills in skill_lists:
+            counts = {}
+            for token in tokenize(user_skills):
+                counts[token] = counts.get(token, 0) + 1
+            weights = {}
+            for token, count in counts.items():
+                column = self.tokens.get(token)
+                if scoring == "tfidf":
+                    count = count * (unseen if column is None else self.idf[column])
+                weights[token] = (column, count)
+            norm = np.sqrt(sum(w * w for _, w in weights.values()))
+            for column, weight in weights.values():
+                if column is not None:
+                    indices.append(column)
+                    data.append(weight / norm)
+            indptr.append(len(indices))
+        return sparse.csr_matrix(
+            (np.asarray(data, dtype=np.float64), np.asarray(indices, dtype=np.int32), np.asarray(indptr, dtype=np.int64)),
+            shape=(len(skill_lists), len(self.tokens)),
+        )
+
+    def query_vector(self, user_skills, scoring="cosine"):
+        return self.query_matrix([user_skills], scoring).toarray().ravel()
+
+    def batch_similarities(self, skill_lists, scoring="cosine"):
+        """CVs x groups CSR of `similarities` for several CVs at once, from one sparse product.
+
+        Groups sharing no token with a CV score 0 and are left out of its row.
+        """
+        matrix = self.scored_matrix(scoring)
+        # Job rows on the left so each score is summed in the same order as `similarities`
+        scores = matrix.dot(self.query_matrix(skill_lists, scoring).T.tocsr()).T.tocsr()
+        scores.data = np.round(scores.data * 100, 1)
+        return scores
+
+    def similarities(self, user_skills, rows=None, scoring="cosine"):
+        matrix = self.scored_matrix(scoring)
+        if rows is not None:
+            matrix = matrix[rows]
+        if not user_skills:
+            return np.zeros(matrix.shape[0])
+        scores = matrix.dot(self.query_vector(user_skills, scoring))
+        return np.round(scores * 100, 1)
+
+    def ranked(self, groups, scores, k):
+        """Yield positions into `scores` best first, ties in job order.
+
+        Only the best `k` (plus ties) are sorted at a time, found with a partition,
+        so callers that stop after a few results never sort the whole candidate set.
+        """
+        k = max(int(k), 1)
+        remaining = np.arange(len(scores))
+        while remaining.size:
+            if remaining.size > k:
+                cutoff = np.partition(scores[remaining], remaining.size - k)[remaining.size - k]
+                best = scores[remaining] >= cutoff
+                head, remaining = remaining[best], remaining[~best]
+            else:
+                head, remaining = remaining, remaining[:0]
+            order = np.lexsort((self.representatives[groups[head]], -scores[head]))
+            yield from head[order]
@@ -0,0 +1,108 @@
+import hashlib
+import numpy as np
+
+# Minhashes are (a * token hash + b) mod PRIME; hashes and a, b are below it, so products fit in int64
+PRIME = (1 << 31) - 1
+HASHES = 64
+# Share of a CV's tokens a job must hold to be scored, unless a query asks otherwise
+CONTAINMENT = 0.3
+
+
+def token_hash(token):
+    """Hash of a token below PRIME, the same in every process and for every index."""
+    return int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "little") % PRIME
+
+
+class MinHashLSH:
+    """MinHash signatures of token sets, for finding the sets holding much of a query's tokens.
+
+    Every set gets `hashes` minhashes of its tokens' `token_hash`es, so a
+    signature depends only on the tokens and not on ids an index gave them. The
+    sets' minhashes under each hash function are kept sorted (with the set ids in
+    `order`), so one binary search per function finds the sets whose minhash
+    equals the query's: bands of one row each.
+
+    How many of its minhashes match estimates a set's Jaccard similarity to the
+    query. A CV lists far fewer skills than a job, so even a job holding all of
+    them has a low Jaccard similarity to it, and a fixed Jaccard threshold misses
+    it. As in LSH Ensemble, the threshold is instead the share of the query's m
+    tokens a set holds, t, which for a set of n tokens is a Jaccard similarity of
+    t*m / (m + n - t*m); a set is kept if enough of its minhashes match for that.
+    """
+
+    def __init__(self, a, b, keys, order):
+        self.a = a
+        self.b = b
+        self.keys = keys
+        self.order = order
+
+    @classmethod
+    def build(cls, indptr, token_hashes, hashes=HASHES, seed=0):
+        """Index of the sets of `token_hashes` given as CSR rows by `indptr`."""
+        rng = np.random.default_rng(seed)
+        lsh = cls(
+            rng.integers(1, PRIME, hashes, dtype=np.int64),
+            rng.integers(0, PRIME, hashes, dtype=np.int64),
+            np.empty((hashes, 0), dtype=np.int32),
+            np.empty((hashes, 0), dtype=np.int32),
+        )
+        return lsh.extended(indptr, token_hashes, 0)
+
+    @classmethod
+    def from_artifact(cls, artifact):
+        return cls(*(artifact.array("lsh." + name) for name in ("a", "b", "minhashes", "order")))
+
+    def to_arrays(self):
+        return {"lsh.a": self.a, "lsh.b": self.b, "lsh.minhashes": self.keys, "lsh.order": self.order}
+
+    @property
+    def hashes(self):
+        return self.keys.shape[0]
+
+    def signatures(self, indptr, token_hashes):
+        """hashes x sets minhashes of the sets of `token_hashes` given as CSR rows by `indptr`."""
+        sizes = np.diff(indptr)
+        nonempty = sizes > 0
+        starts = indptr[:-1][nonempty]
+        token_hashes = np.asarray(token_hashes, dtype=np.int64)
+        # Empty sets get PRIME, which no real minhash equals
+        minhashes = np.full((self.hashes, len(sizes)), PRIME, dtype=np.int32)
+        # As many functions at a time as keep the hashed tokens to a few million values
+        step = max(1, (1 << 22) // max(len(token_hashes), 1))
+        for lo in range(0, self.hashes if len(token_hashes) else 0, step):
+            hi = min(lo + step, self.hashes)
+            hashed = (self.a[lo:hi, None] * token_hashes + self.b[lo:hi, None]) % PRIME
+            minhashes[lo:hi, nonempty] = np.minimum.reduceat(hashed, starts, axis=1)
+        return minhashes
+
+    def extended(self, indptr, token_hashes, start):
+        """Index with the sets of `token_hashes` (CSR rows by `indptr`) added as ids `start` on."""
+        keys = self.signatures(indptr, token_hashes)
+        ids = np.broadcast_to(np.arange(start, start + keys.shape[1], dtype=np.int32), keys.shape)
+        keys = np.concatenate([self.keys, keys], axis=1)
+        order = np.concatenate([self.order, ids], axis=1)
+        sort = np.argsort(keys, axis=1, kind="stable")
+        return MinHashLSH(self.a, self.b, np.take_along_axis(keys, sort, 1), np.take_along_axis(order, sort, 1))
+
+    def candidates(self, token_hashes, sizes, containment=None):
+        """Sorted ids of the sets likely to hold `containment` of the distinct `token_hashes`.
+
+        `sizes` gives the number of tokens of every set, by id.
+        """
+        containment = CONTAINMENT if containment is None else min(max(float(containment), 0.0), 1.0)
+        token_hashes = np.unique(np.asarray(token_hashes, dtype=np.int64))
+        if not len(token_hashes):
+            return np.empty(0, dtype=np.int32)
+        minhashes = self.signatures(np.asarray([0, len(token_hashes)]), token_hashes)[:, 0]
+        found = []
+        for function in range(self.hashes):
+            lo, hi = self.keys[function].searchsorted(minhashes[function], "left"), self.keys[function].searchsorted(minhashes[function], "right")
+            found.append(self.order[function, lo:hi])
+        matches = np.bincount(np.concatenate(found), minlength=self.keys.shape[1])
+        ids = np.flatnonzero(matches)
+        shared = containment * len(token_hashes)
+        similarity = shared / (len(token_hashes) + sizes[ids] - shared)
+        # A set holding just `containment` of the query matches `expected` minhashes on average; allow one standard deviation less
+        expected = self.hashes * similarity
+        keep = matches[ids] >= np.maximum(expected - np.sqrt(expected * (1 - similarity)), 1)
+        return ids[keep].astype(np.int32)
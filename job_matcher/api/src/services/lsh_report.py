@@ -0,0 +1,101 @@
+import argparse
+import json
+import os
+import time
+import numpy as np
+from .main import CVMatcher
+from .index import SCORING_MODES
+from .benchmark import synthetic
+
+CONTAINMENTS = (0.1, 0.2, 0.3, 0.4, 0.5)
+# Skills in the short lists, like those of a CV that lists only its main ones
+SHORT_SKILLS = (2, 8)
+
+
+def sample_queries(snapshot, count, seed=0):
+    """{"cv": skills read from synthetic CVs, "short": 2-8 of each of those} for `count` CVs."""
+    rng = np.random.default_rng(seed)
+    extractor = snapshot.extractor
+    cvs = []
+    for _ in range(count):
+        lines = synthetic.synthetic_cv(snapshot.catalog, synthetic.CV_LENGTHS[0], rng)
+        skills = sorted(extractor.skills[i] for i in extractor.find("\n".join(lines)))
+        if skills:
+            cvs.append(skills)
+    low, high = SHORT_SKILLS
+    short = [rng.choice(skills, min(len(skills), int(rng.integers(low, high + 1))), replace=False).tolist() for skills in cvs]
+    return {"cv": cvs, "short": short}
+
+
+def top_groups(index, user_skills, groups, k, scoring):
+    similarities = index.similarities(user_skills, groups, scoring)
+    ranked = index.ranked(groups, similarities, k)
+    return [int(groups[position]) for _, position in zip(range(k), ranked)]
+
+
+def evaluate(index, queries, top_k=3, containments=CONTAINMENTS, scoring="cosine", min_overlap=1):
+    """Recall@k of LSH search against exact search, and the candidates and time per query of each."""
+    start = time.perf_counter()
+    candidates = [index.candidates(q, min_overlap) for q in queries]
+    exact = [top_groups(index, q, groups, top_k, scoring) for q, groups in zip(queries, candidates)]
+    exact_ms = (time.perf_counter() - start) / len(queries) * 1000
+    report = {
+        "queries": len(queries),
+        "skills": round(float(np.mean([len(q) for q in queries])), 1),
+        "exact": {"candidates": round(float(np.mean([len(g) for g in candidates])), 1), "ms_per_query": round(exact_ms, 3)},
+        "lsh": [],
+    }
+    for containment in containments:
+        found = scored = empty = 0
+        start = time.perf_counter()
+        for query, expected in zip(queries, exact):
+            groups = index.lsh_candidates(query, containment)
+            scored += len(groups)
+            empty += not len(groups)
+            found += len(set(top_groups(index, query, groups, top_k, scoring)) & set(expected))
+        elapsed = time.perf_counter() - start
+        report["lsh"].append({
+            "containment": containment,
+            "recall": round(found / max(sum(len(e) for e in exact), 1), 4),
+            "empty": empty,
+            "candidates": round(scored / len(queries), 1),
+            "ms_per_query": round(elapsed / len(queries) * 1000, 3),
+        })
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure recall and latency of LSH search against exact search on CV-like queries.")
+    parser.add_argument("--data", default=os.path.join("static", "job_data.csv"), help="source CSV")
+    parser.add_argument("--index", default=os.path.join("static", "job_index.bin"), help="compiled job index, used if current")
+    parser.add_argument("--queries", type=int, default=200, help="synthetic CVs to read queries from")
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--containment", type=float, nargs="+", default=list(CONTAINMENTS), help="LSH containment thresholds to try")
+    parser.add_argument("--scoring", choices=SCORING_MODES, default="cosine")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args(argv)
+
+    matcher = CVMatcher(index_path=args.index, data_path=args.data)
+    snapshot = matcher.snapshot
+    report = {
+        "groups": int(snapshot.index.alive.sum()),
+        "top_k": args.top_k,
+        **{name: evaluate(snapshot.index, queries, args.top_k, args.containment, args.scoring, matcher.min_overlap)
+           for name, queries in sample_queries(snapshot, args.queries, args.seed).items()},
+    }
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    print(f"{report['groups']} job groups, recall of the exact top {report['top_k']}")
+    for name, title in (("cv", "skills read from synthetic CVs"), ("short", f"{SHORT_SKILLS[0]}-{SHORT_SKILLS[1]} of those skills")):
+        part = report[name]
+        print(f"\n{part['queries']} queries of {title} ({part['skills']} on average)")
+        print(f"exact: {part['exact']['candidates']} candidates, {part['exact']['ms_per_query']} ms/query")
+        print(f"{'containment':>11} {'recall':>7} {'empty':>5} {'candidates':>10} {'ms/query':>9}")
+        for row in part["lsh"]:
+            print(f"{row['containment']:>11} {row['recall']:>7} {row['empty']:>5} {row['candidates']:>10} {row['ms_per_query']:>9}")
+
+
+if __name__ == "__main__":
+    main()
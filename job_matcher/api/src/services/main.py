@@ -1,11 +1,21 @@
-import pandas as pd
+import asyncio
+import collections
+import functools
+import importlib
+import itertools
+import math
+import numpy as np
 import os
-import docx
-import PyPDF2
-import re
+import time
 from fastapi import UploadFile
-from sklearn.metrics.pairwise import cosine_similarity
-from sklearn.feature_extraction.text import CountVectorizer
+from .artifact import Artifact, source_stamp, source_version, write_artifact
+from .catalog import JobCatalog
+from .index import JobIndex, SCORING_MODES, SEARCH_MODES, tokenize
+from .lsh import CONTAINMENT
+from .extractor import SkillExtractor
+from .cv_cache import CVCache, upload_key
+from .pool import Upload
+from . import documents, metrics, profiling, shared_index
 
 STOPWORDS = {
     "com", "www", "edu", "the", "and", "for", "are", "can", "etc", "of", "in", "to", "a", "is",
@@ -17,15 +27,159 @@ LOW_VALUE_TERMS = {
     "student", "education", "experience", "training", "learning"
 }
 
+DATA_PATH = os.path.join("static", "job_data.csv")
+# Imported on first use, or by `warm_up`, as they are slow to import and not needed to start
+PARSER_MODULES = ("PyPDF2",)
+WARM_UP_SKILLS = 20
+
+ERROR_TYPES = ("unsupported_file", "bad_batch", "rejected", "timeout", "internal")
+UPLOAD_READ = metrics.histogram("cv_upload_read_seconds", "Reading and hashing an uploaded CV.")
+TEXT_EXTRACTION = metrics.histogram("cv_text_extraction_seconds", "Extracting the text of a CV, by file type.", "format", ("pdf", "docx", "txt"))
+SKILL_EXTRACTION = metrics.histogram("cv_skill_extraction_seconds", "Finding the known skills in a CV's text.")
+PDF_PAGES = metrics.histogram("cv_pdf_pages", "Pages read of a PDF CV.", buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500))
+PDF_TRUNCATED = metrics.counter("cv_pdf_truncated_total", "PDF CVs only partly read, by the limit they reached.", "limit", ("pages", "time"))
+SCORING = metrics.histogram("cv_scoring_seconds", "Scoring the jobs against a CV, or against a whole batch at once.")
+TOP_K = metrics.histogram("cv_top_k_seconds", "Picking the top jobs for a CV and comparing their skills with it.")
+SERIALIZATION = metrics.histogram("cv_response_serialization_seconds", "Rendering a result as JSON.")
+ERRORS = metrics.counter("cv_errors_total", "CVs that got an error, by cause.", "type", ERROR_TYPES)
+
+class Snapshot:
+    """One version of the jobs: everything a request reads, replaced as a whole."""
+
+    def __init__(self, catalog, index, extractor, version):
+        self.catalog = catalog
+        self.index = index
+        self.extractor = extractor
+        self.version = version
+
+
 class CVMatcher:
-    def __init__(self):
-        self.data_path = os.path.join("static", "job_data.csv")
-        self.df, self.error = self.load_data()
+    def __init__(self, min_overlap=1, index_path=None, data_path=None, cache=None, lsh_containment=None,
+                 pdf_max_pages=0, pdf_max_bytes=0, pdf_budget=0, pdf_processes=0):
+        self.min_overlap = min_overlap
+        self.lsh_containment = lsh_containment
+        self.pdf_max_pages = pdf_max_pages
+        self.pdf_max_bytes = pdf_max_bytes
+        self.pdf_budget = pdf_budget
+        self.pdf_pool = documents.PagePool(pdf_processes) if pdf_processes else None
+        self.cache = cache or CVCache()
+        self.data_path = data_path or DATA_PATH
+        self.index_path = index_path
+        self.error = None
+        self.version = shared_index.file_version(self.index_path or self.data_path)
+        self.snapshot = self.load()
+
+    @property
+    def catalog(self):
+        return self.snapshot.catalog
+
+    @property
+    def index(self):
+        return self.snapshot.index
+
+    @property
+    def extractor(self):
+        return self.snapshot.extractor
+
+    @property
+    def all_skills(self):
+        return self.snapshot.catalog.skills
+
+    def load(self):
+        artifact = self.open_index()
+        if artifact is not None:
+            return Snapshot(
+                JobCatalog.from_artifact(artifact),
+                JobIndex.from_artifact(artifact, ignore=LOW_VALUE_TERMS),
+                SkillExtractor.from_artifact(artifact),
+                source_version(artifact.meta),
+            )
+        df, self.error = self.load_data()
         if self.error:
             raise ValueError(self.error)
-        self.all_skills = self.get_all_skills()
+        catalog = JobCatalog.from_frame(df)
+        return Snapshot(
+            catalog,
+            JobIndex(catalog.skill_lists(), ignore=LOW_VALUE_TERMS),
+            SkillExtractor(list(catalog.skills)),
+            source_version(source_stamp(self.data_path)),
+        )
+
+    def refresh(self):
+        """Reload if another worker has since written a new version of the jobs."""
+        version = shared_index.file_version(self.index_path or self.data_path)
+        if version != self.version:
+            self.version = version
+            self.snapshot = self.load()
+
+    def apply_changes(self, upserts=(), deletes=()):
+        """Add or replace `upserts` and delete the jobs keyed by `deletes`.
+
+        The new catalog, index and extractor are derived from the current ones and
+        swapped in with a single assignment, so requests already running finish on the
+        version they started with. The CSV and index file are rewritten under a lock
+        shared by all workers, which pick the change up through `refresh`.
+        """
+        with shared_index.locked(self.data_path):
+            self.refresh()
+            snapshot = self.snapshot
+            catalog, changes = snapshot.catalog.updated(upserts, deletes)
+            unused = np.flatnonzero(catalog.skill_counts() == 0).tolist()
+            index = snapshot.index.updated(catalog, changes)
+            extractor = snapshot.extractor.updated(catalog.skills, unused)
+            catalog.write_csv(self.data_path)
+            snapshot = Snapshot(catalog, index, extractor, source_version(source_stamp(self.data_path)))
+            if self.index_path:
+                self.save_snapshot(snapshot, self.index_path)
+            self.version = shared_index.file_version(self.index_path or self.data_path)
+            self.snapshot = snapshot
+        return {
+            "added": len(changes["inserted"]),
+            "updated": len(changes["updated"]),
+            "deleted": len(changes["deleted"]),
+            "not_found": [list(key) for key in changes["not_found"]],
+            "jobs": catalog.live_count(),
+        }
+
+    @classmethod
+    def shared(cls, directory, name, index_path=None, data_path=None, **kwargs):
+        """Matcher attached read-only to a copy of the index in shared memory.
+
+        The first worker to start compiles it (from `index_path` when that is current,
+        else from the CSV); the rest attach to the same pages.
+        """
+        data_path = data_path or DATA_PATH
+        path = shared_index.attach(
+            directory, name, data_path,
+            lambda path: cls(index_path=index_path, data_path=data_path).save_index(path),
+        )
+        return cls(index_path=path, data_path=data_path, **kwargs)
+
+    def open_index(self):
+        if not self.index_path or not os.path.exists(self.index_path):
+            return None
+        try:
+            artifact = Artifact(self.index_path)
+        except ValueError as e:
+            print(f"Warning: Ignoring job index: {e}")
+            return None
+        if "index.job_groups" not in artifact or "extractor.keys" not in artifact:
+            print(f"Warning: {self.index_path} has no matching index, loading {self.data_path} instead")
+            return None
+        if artifact.is_stale(self.data_path):
+            print(f"Warning: {self.index_path} was compiled from a different {self.data_path}, loading the CSV instead")
+            return None
+        return artifact
+
+    def save_index(self, path):
+        self.save_snapshot(self.snapshot, path)
+
+    def save_snapshot(self, snapshot, path):
+        arrays = {**snapshot.catalog.to_arrays(), **snapshot.index.to_arrays(), **snapshot.extractor.to_arrays()}
+        write_artifact(path, arrays, meta={**source_stamp(self.data_path), "jobs": snapshot.catalog.live_count()})
 
     def load_data(self):
+        import pandas as pd
         if not os.path.exists(self.data_path):
             return pd.DataFrame(), f"File not found: {self.data_path}"
 
@@ -42,47 +196,81 @@ class CVMatcher:
 
         return df, None
 
+    def text_chunks(self, file: UploadFile):
+        """The upload's text in pieces, parsed as they are iterated over."""
+        ext = file.filename.split('.')[-1].lower()
+        if ext == 'pdf':
+            return documents.PdfText(file.file, self.pdf_max_pages, self.pdf_max_bytes, self.pdf_budget, self.pdf_pool)
+        elif ext == 'docx':
+            return documents.docx_chunks(file.file)
+        elif ext == 'txt':
+            return documents.txt_chunks(file.file)
+        raise ValueError(f"Unsupported file type: {ext}")
+
     def extract_text_from_cv(self, file: UploadFile):
-        text = ""
         ext = file.filename.split('.')[-1].lower()
         try:
-            if ext == 'pdf':
-                reader = PyPDF2.PdfReader(file.file)
-                for page in reader.pages:
-                    text += page.extract_text() or ""
-            elif ext == 'docx':
-                doc = docx.Document(file.file)
-                for para in doc.paragraphs:
-                    text += para.text + "\n"
-            elif ext == 'txt':
-                text = file.file.read().decode("utf-8")
-            else:
-                return None, f"Unsupported file type: {ext}"
-            return text, None
+            with TEXT_EXTRACTION.time(ext):
+                return "".join(self.text_chunks(file)), None
+        except Exception as e:
+            return None, str(e)
+
+    def lookup(self, file: UploadFile):
+        """(cache key, cached entry or None) for an upload."""
+        with UPLOAD_READ.time():
+            key = upload_key(file.file, file.filename.split('.')[-1])
+        return key, self.cache.get(key)
+
+    def read_cv(self, file: UploadFile, snapshot, cached=None):
+        """(entry, error): the upload's text and its skill ids under `snapshot`, reusing `cached`."""
+        entry = cached
+        if entry is None:
+            return self.read_new(file, snapshot)
+        if entry.get("version") != snapshot.version:
+            entry = dict(entry, version=snapshot.version, skill_ids=self.skill_ids(entry["text"], snapshot))
+        return entry, None
+
+    def read_new(self, file: UploadFile, snapshot):
+        """`read_cv` for an upload not in the cache, finding its skills as its text is parsed."""
+        ext = file.filename.split('.')[-1].lower()
+        reader = documents.TextReader(functools.partial(self.text_chunks, file))
+        start = time.perf_counter()
+        try:
+            skill_ids = list(snapshot.extractor.find_chunks(reader))
         except Exception as e:
             return None, str(e)
+        finally:
+            TEXT_EXTRACTION.observe(reader.seconds, ext)
+        SKILL_EXTRACTION.observe(time.perf_counter() - start - reader.seconds)
+        document = {"format": ext, **reader.stats()}
+        if ext == 'pdf':
+            PDF_PAGES.observe(document["pages"])
+            if document["truncated"]:
+                PDF_TRUNCATED.inc(document["truncated"])
+        return {"text": reader.text(), "version": snapshot.version, "skill_ids": skill_ids, "document": document}, None
 
-    def extract_skills(self, text):
+    def remember(self, key, cached, entry):
+        if entry is not None and (cached is None or cached.get("version") != entry["version"]):
+            self.cache.put(key, entry)
+
+    def skill_ids(self, text, snapshot):
         if not text:
             return []
-        text_lower = text.lower()
-        clean_text = re.sub(r'[^a-zA-Z0-9\s]', ' ', text_lower)
-        words = clean_text.split()
-        clean_words = [w for w in words if len(w) > 2 and w not in STOPWORDS and not any(char.isdigit() for char in w)]
-        found_skills = []
-        for skill in self.all_skills:
-            skill_lower = skill.lower()
-            if re.search(r'\b' + re.escape(skill_lower) + r'\b', text_lower):
-                found_skills.append(skill)
-        return list(set(found_skills))
+        with SKILL_EXTRACTION.time():
+            return list(snapshot.extractor.find(text))
+
+    def extract_skills(self, text, snapshot=None):
+        snapshot = snapshot or self.snapshot
+        return [snapshot.extractor.skills[i] for i in self.skill_ids(text, snapshot)]
 
     def calculate_similarity(self, user_skills, job_skills):
         if not user_skills or not job_skills:
             return 0.0
-        vectorizer = CountVectorizer().fit([' '.join(user_skills + job_skills)])
-        skill_vectors = vectorizer.transform([' '.join(user_skills), ' '.join(job_skills)])
-        similarity = cosine_similarity(skill_vectors)[0][1]
-        return round(similarity * 100, 1)
+        user, job = collections.Counter(tokenize(user_skills)), collections.Counter(tokenize(job_skills))
+        norm = math.sqrt(sum(n * n for n in user.values()) * sum(n * n for n in job.values()))
+        if not norm:
+            return 0.0
+        return round(sum(n * job[token] for token, n in user.items()) / norm * 100, 1)
 
     def analyze_skills(self, user_skills, job_skills):
         user_set = set([s.lower() for s in user_skills])
@@ -92,38 +280,184 @@ class CVMatcher:
         return matched, missing, round(len(matched)/total*100, 1) if total else 0.0, round(len(missing)/total*100, 1) if total else 0.0
 
     def get_all_skills(self):
-        all_skills = []
-        for skill_text in self.df['skills']:
-            skills = [s.strip() for s in str(skill_text).split(',')]
-            all_skills.extend(skills)
-        return list(set(all_skills))
-
-    def process_cv(self, file: UploadFile):
-        cv_text, error = self.extract_text_from_cv(file)
+        return list(self.catalog.skills)
+
+    def get_job_skills(self):
+        return self.catalog.skill_lists()
+
+    def worker_args(self):
+        """Keyword arguments for a matcher in a worker process reading the same jobs.
+
+        Pool workers cannot start processes of their own, so they read a PDF's pages one after another.
+        """
+        return {
+            "min_overlap": self.min_overlap, "index_path": self.index_path, "data_path": self.data_path, "lsh_containment": self.lsh_containment,
+            "pdf_max_pages": self.pdf_max_pages, "pdf_max_bytes": self.pdf_max_bytes, "pdf_budget": self.pdf_budget,
+        }
+
+    @classmethod
+    def worker(cls, kwargs):
+        # Workers are handed cached entries, so they keep no cache of their own
+        matcher = cls(cache=CVCache(0), **kwargs)
+        matcher.warm_up()
+        return matcher
+
+    def warm_up(self):
+        """Import the CV parsers and score some skills every way, so the first request pays for neither."""
+        for name in PARSER_MODULES:
+            importlib.import_module(name)
+        if self.pdf_pool is not None:
+            self.pdf_pool.warm_up()
+        snapshot = self.snapshot
+        skills = [snapshot.catalog.skills[i] for i in range(min(WARM_UP_SKILLS, len(snapshot.catalog.skills)))]
+        if not skills:
+            return
+        snapshot.extractor.find(" ".join(skills))
+        for scoring in SCORING_MODES:
+            snapshot.index.similarities(skills, scoring=scoring)
+        snapshot.index.lsh_candidates(skills, self.lsh_containment)
+
+    def process_cv(self, file: UploadFile, top_k=3, min_overlap=None, scoring="cosine", search="exact"):
+        key, cached = self.lookup(file)
+        result, entry = self.analyze(file, cached, top_k, min_overlap, scoring, search)
+        self.remember(key, cached, entry)
+        return result
+
+    async def process_upload(self, file: UploadFile, pool=None, timeout=None, top_k=3, min_overlap=None, scoring="cosine", search="exact", profile=None):
+        """`process_cv` off the event loop: in a worker of `pool` if given, else in a thread.
+
+        Raises asyncio.TimeoutError after `timeout` seconds, killing the pool worker.
+        With a `profiling.Capture` as `profile`, the reading and matching are profiled into it.
+        """
+        loop = asyncio.get_running_loop()
+        key, cached = await loop.run_in_executor(None, self.lookup, file)
+        if pool is None:
+            analyze = profiling.wrap(self.analyze, profile)
+            task = asyncio.wait_for(loop.run_in_executor(None, analyze, file, cached, top_k, min_overlap, scoring, search), timeout)
+        else:
+            content = None if cached else await loop.run_in_executor(None, file.file.read)
+            task = pool.run(profiling.wrap(analyze_upload, profile), file.filename, content, cached, top_k, min_overlap, scoring, search, timeout=timeout)
+        result, entry = await profiling.collect(task, profile)
+        self.remember(key, cached, entry)
+        return result
+
+    async def read_upload(self, file: UploadFile, pool=None, timeout=None):
+        """`read_cv` for an upload against the current jobs, off the event loop like `process_upload`."""
+        loop = asyncio.get_running_loop()
+        key, cached = await loop.run_in_executor(None, self.lookup, file)
+        if pool is None:
+            task = asyncio.wait_for(loop.run_in_executor(None, self.read_current, file, cached), timeout)
+        else:
+            content = None if cached else await loop.run_in_executor(None, file.file.read)
+            task = pool.run(read_upload, file.filename, content, cached, timeout=timeout)
+        entry, error = await task
+        self.remember(key, cached, entry)
+        return entry, error
+
+    def read_current(self, file: UploadFile, cached=None):
+        self.refresh()
+        return self.read_cv(file, self.snapshot, cached)
+
+    async def process_batch(self, files, pool=None, timeout=None, top_k=3, min_overlap=None, scoring="cosine", search="exact", concurrency=16):
+        """Yield (filename, result) for every upload in `files`, in the order they finish.
+
+        Up to `concurrency` CVs are read at once, each as in `read_upload`, so only
+        those are held in memory. Whenever some have finished, those are scored
+        against every job together with one sparse matrix-matrix product, so a
+        batch whose CVs are all cached is a single product.
+        """
+        self.refresh()
+        snapshot = self.snapshot
+        files = iter(files)
+        pending = {}
+
+        def start_reads():
+            for file in itertools.islice(files, concurrency - len(pending)):
+                pending[asyncio.ensure_future(self.read_upload(file, pool, timeout))] = file.filename
+
+        start_reads()
+        try:
+            while pending:
+                done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                ready = []
+                for task in done:
+                    filename = pending.pop(task)
+                    try:
+                        entry, error = task.result()
+                        cause = "rejected"
+                    except asyncio.TimeoutError:
+                        entry, error, cause = None, "Timed out processing the CV.", "timeout"
+                    except Exception as e:
+                        entry, error, cause = None, str(e), "internal"
+                    if error:
+                        ERRORS.inc(cause)
+                        yield filename, {"error": error}
+                        continue
+                    # Read by a worker that may have been on another version of the jobs
+                    skill_ids = entry["skill_ids"] if entry["version"] == snapshot.version else self.skill_ids(entry["text"], snapshot)
+                    ready.append((filename, [snapshot.extractor.skills[i] for i in skill_ids], entry.get("document")))
+                start_reads()
+                if not ready:
+                    continue
+                with SCORING.time():
+                    scores = snapshot.index.batch_similarities([user_skills for _, user_skills, _ in ready], scoring)
+                for i, (filename, user_skills, document) in enumerate(ready):
+                    yield filename, {**self.rank(user_skills, snapshot, top_k, min_overlap, scoring, search, scores[i]), "document": document}
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def analyze(self, file: UploadFile, cached=None, top_k=3, min_overlap=None, scoring="cosine", search="exact"):
+        """(result, cache entry) for an upload, given what the cache had for it."""
+        self.refresh()
+        snapshot = self.snapshot
+        entry, error = self.read_cv(file, snapshot, cached)
         if error:
-            return {"error": error}
+            return {"error": error}, None
+        user_skills = [snapshot.extractor.skills[i] for i in entry["skill_ids"]]
+        return {**self.rank(user_skills, snapshot, top_k, min_overlap, scoring, search), "document": entry.get("document")}, entry
 
-        user_skills = self.extract_skills(cv_text)
+    def rank(self, user_skills, snapshot, top_k=3, min_overlap=None, scoring="cosine", search="exact", scores=None):
+        """Top matches for `user_skills`; `scores` is the CV's row of `JobIndex.batch_similarities` if already computed.
+
+        With `search="lsh"` only the groups found by `JobIndex.lsh_candidates` are
+        scored (`min_overlap` does not apply), and the result says how many that was.
+        """
         if not user_skills:
             return {"cv_skills": [], "top_matches": [], "bar_chart_data": []}
 
-        all_matches = []
+        top_matches = []
         seen_combinations = set()
+        index, catalog = snapshot.index, snapshot.catalog
+        start = time.perf_counter()
+        if search == "lsh":
+            groups = index.lsh_candidates(user_skills, self.lsh_containment)
+        elif search == "exact":
+            groups = index.candidates(user_skills, self.min_overlap if min_overlap is None else min_overlap)
+        else:
+            raise ValueError(f"Unknown search {search!r}, expected one of {', '.join(SEARCH_MODES)}")
+        if scores is None:
+            similarities = index.similarities(user_skills, groups, scoring)
+            SCORING.observe(time.perf_counter() - start)
+        else:
+            similarities = scores[:, groups].toarray().ravel()
 
-        for _, row in self.df.iterrows():
-            job_skills = [s.strip() for s in str(row['skills']).split(',') if s.strip()]
-            similarity = self.calculate_similarity(user_skills, job_skills)
+        start = time.perf_counter()
+        for position in index.ranked(groups, similarities, top_k):
+            row = index.representatives[groups[position]]
+            job = catalog.job(row)
+            job_skills = catalog.skills_of(row)
             matched, missing, match_pct, miss_pct = self.analyze_skills(user_skills, job_skills)
             key = (frozenset(matched), frozenset(missing))
             if key in seen_combinations:
                 continue
             seen_combinations.add(key)
 
-            all_matches.append({
-                "job_title": row['Job Title'],
-                "governorate": row['Governorate'],
-                "professional_level": row.get('professional level', row.get('professional Level')),
-                "similarity_percentage": similarity,
+            top_matches.append({
+                "job_title": job['title'],
+                "governorate": job['governorate'],
+                "professional_level": job['level'],
+                "similarity_percentage": similarities[position],
                 "matched_skills": matched,
                 "missing_skills": missing,
                 "pie_chart_data": {
@@ -133,15 +467,41 @@ class CVMatcher:
                     "missing_percentage": miss_pct
                 }
             })
+            if len(top_matches) == top_k:
+                break
+
+        TOP_K.observe(time.perf_counter() - start)
 
-        top_matches = sorted(all_matches, key=lambda x: x['similarity_percentage'], reverse=True)[:3]
         bar_chart_data = {
             "job_titles": [match['job_title'] for match in top_matches],
             "similarities": [match['similarity_percentage'] for match in top_matches]
         }
 
-        return {
+        result = {
             "cv_skills": user_skills,
             "top_matches": top_matches,
             "bar_chart_data": bar_chart_data
         }
+        if search == "lsh":
+            result["search"] = {
+                "mode": "lsh",
+                "containment": CONTAINMENT if self.lsh_containment is None else self.lsh_containment,
+                "hashes": index.lsh.hashes,
+                "candidates": len(groups),
+                "groups": int(index.alive.sum()),
+            }
+        return result
+
+
+def analyze_upload(matcher, filename, content, cached, top_k, min_overlap, scoring, search):
+    """`CVMatcher.analyze` as a `WorkerPool` call."""
+    return matcher.analyze(Upload(filename, content), cached, top_k, min_overlap, scoring, search)
+
+
+def read_upload(matcher, filename, content, cached):
+    """`CVMatcher.read_current` as a `WorkerPool` call."""
+    return matcher.read_current(Upload(filename, content), cached)
+
+
+# The matcher the shared tools, such as compile_index, build this service's index with
+Matcher = CVMatcher
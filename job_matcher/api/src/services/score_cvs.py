@@ -0,0 +1,183 @@
+import argparse
+import asyncio
+import csv
+import glob
+import importlib.util
+import json
+import os
+import sys
+from .main import CVMatcher
+from .cv_cache import CVCache
+from .index import SCORING_MODES, SEARCH_MODES
+from .pool import Upload, WorkerPool
+from .uploads import CV_EXTENSIONS
+
+COLUMNS = [
+    "cv_file", "rank", "job_title", "governorate", "professional_level",
+    "similarity_percentage", "matched_skills", "missing_skills", "error",
+]
+
+
+def find_cvs(patterns):
+    """Sorted CV paths under the directories and globs in `patterns`."""
+    paths = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            for root, _, names in os.walk(pattern):
+                paths.update(os.path.join(root, name) for name in names)
+        else:
+            paths.update(glob.glob(pattern, recursive=True))
+    return sorted(path for path in paths if os.path.isfile(path) and path.lower().endswith(CV_EXTENSIONS))
+
+
+def start_matcher(kwargs, cache_dir):
+    return CVMatcher(cache=CVCache(0, cache_dir), **kwargs)
+
+
+def score_file(matcher, path, top_k, scoring, search):
+    with open(path, "rb") as f:
+        return matcher.process_cv(Upload(path, f.read()), top_k=top_k, scoring=scoring, search=search)
+
+
+def result_rows(path, result):
+    if "error" in result:
+        return [[path, "", "", "", "", "", "", "", result["error"]]]
+    if not result["top_matches"]:
+        return [[path, "", "", "", "", "", "", "", ""]]
+    return [
+        [
+            path, rank, match["job_title"], match["governorate"], match["professional_level"],
+            match["similarity_percentage"], "; ".join(match["matched_skills"]), "; ".join(match["missing_skills"]), "",
+        ]
+        for rank, match in enumerate(result["top_matches"], 1)
+    ]
+
+
+class Checkpoint:
+    """Append-only record of the CVs done and how long the results file was after each.
+
+    On resume the results file is cut back to the last recorded length, dropping
+    rows written for a CV whose checkpoint line never made it to disk.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.done = set()
+        self.offset = 0
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        break
+                    self.done.add(record["file"])
+                    self.offset = record["offset"]
+        self.file = open(path, "a", encoding="utf-8")
+
+    def add(self, path, offset):
+        self.file.write(json.dumps({"file": path, "offset": offset}) + "\n")
+        self.file.flush()
+        self.done.add(path)
+
+    def close(self):
+        self.file.close()
+
+
+async def score_all(paths, results, checkpoint, pool, top_k, scoring, search, timeout, in_flight):
+    writer = csv.writer(results)
+    if not results.tell():
+        writer.writerow(COLUMNS)
+        results.flush()
+    pending = {}
+    todo = iter(paths)
+    scored = errors = 0
+    try:
+        while True:
+            for path in todo:
+                pending[asyncio.ensure_future(pool.run(score_file, path, top_k, scoring, search, timeout=timeout))] = path
+                if len(pending) >= in_flight:
+                    break
+            if not pending:
+                break
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                path = pending.pop(task)
+                try:
+                    result = task.result()
+                except asyncio.TimeoutError:
+                    result = {"error": f"Timed out after {timeout}s"}
+                except Exception as e:
+                    result = {"error": str(e) or type(e).__name__}
+                errors += "error" in result
+                writer.writerows(result_rows(path, result))
+                results.flush()
+                checkpoint.add(path, results.tell())
+                scored += 1
+                if scored % 100 == 0:
+                    print(f"{scored}/{len(paths)} CVs scored", file=sys.stderr)
+    finally:
+        for task in pending:
+            task.cancel()
+        pool.close()
+    return scored, errors
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Score every CV in a set of directories or globs against the job index.")
+    parser.add_argument("inputs", nargs="+", help="directories or glob patterns of PDF, DOCX and TXT files")
+    parser.add_argument("--output", required=True, help="results file, .csv or .parquet")
+    parser.add_argument("--top-k", type=int, default=3, help="jobs per CV")
+    parser.add_argument("--scoring", choices=SCORING_MODES, default="cosine", help="plain count cosine, or idf-weighted")
+    parser.add_argument("--search", choices=SEARCH_MODES, default="exact", help="score every job sharing a skill, or only MinHash-LSH candidates")
+    parser.add_argument("--lsh-containment", type=float, help="share of a CV's tokens a job must hold to be scored with --search lsh: less finds more")
+    parser.add_argument("--min-overlap", type=int, default=1, help="skills a job must share with a CV to be ranked")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="worker processes")
+    parser.add_argument("--timeout", type=float, default=120, help="seconds before a single CV is given up on")
+    parser.add_argument("--checkpoint", help="progress file to resume from (default: OUTPUT.checkpoint)")
+    parser.add_argument("--cache-dir", help="CV cache directory, so unchanged CVs are not parsed again on the next run")
+    parser.add_argument("--data", default=os.path.join("static", "job_data.csv"), help="source CSV")
+    parser.add_argument("--index", default=os.path.join("static", "job_index.bin"), help="compiled job index, used if current")
+    args = parser.parse_args(argv)
+    if args.top_k < 1:
+        parser.error("--top-k must be at least 1")
+
+    parquet = args.output.lower().endswith(".parquet")
+    if parquet and not (importlib.util.find_spec("pyarrow") or importlib.util.find_spec("fastparquet")):
+        parser.error("writing Parquet needs pyarrow or fastparquet installed")
+    paths = find_cvs(args.inputs)
+    if not paths:
+        parser.error("no PDF, DOCX or TXT files found")
+
+    # Results go to a CSV next to the output until the run completes
+    partial = args.output + ".partial.csv"
+    checkpoint = Checkpoint(args.checkpoint or args.output + ".checkpoint")
+    if checkpoint.offset > (os.path.getsize(partial) if os.path.exists(partial) else 0):
+        parser.error(f"{partial} is shorter than {checkpoint.path} says; delete the checkpoint to start over")
+    with open(partial, "a+", newline="", encoding="utf-8") as results:
+        results.truncate(checkpoint.offset)
+        results.seek(checkpoint.offset)
+        todo = [path for path in paths if path not in checkpoint.done]
+        if checkpoint.done:
+            print(f"Resuming: {len(paths) - len(todo)} of {len(paths)} CVs already scored", file=sys.stderr)
+        kwargs = {"min_overlap": args.min_overlap, "index_path": args.index, "data_path": args.data, "lsh_containment": args.lsh_containment}
+        pool = WorkerPool(max(args.workers, 1), start_matcher, (kwargs, args.cache_dir))
+        try:
+            scored, errors = asyncio.run(score_all(todo, results, checkpoint, pool, args.top_k, args.scoring, args.search, args.timeout, 4 * pool.size))
+        finally:
+            checkpoint.close()
+
+    if parquet:
+        import pandas as pd
+        numeric = {"rank": "Int64", "similarity_percentage": "float64"}
+        frame = pd.read_csv(partial, dtype={**{column: str for column in COLUMNS}, **numeric}, keep_default_na=False, na_values={column: [""] for column in numeric})
+        frame.to_parquet(args.output, index=False)
+        os.unlink(partial)
+    else:
+        os.replace(partial, args.output)
+    os.unlink(checkpoint.path)
+    print(f"Wrote {args.output}: {scored} CVs scored, {errors} failed, {len(paths) - len(todo)} from an earlier run")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+import os
+import tempfile
+import zipfile
+import zlib
+from fastapi import UploadFile
+from .upload_limits import SNIFF_BYTES, check_upload, sniff
+
+CV_EXTENSIONS = (".pdf", ".docx", ".txt")
+# Unzipped CVs are kept in memory up to this size and on disk beyond it, so a batch of 500 holds at most 32 MB
+SPOOL_BYTES = 64 * 1024
+READ_SIZE = 64 * 1024
+# Members unzipping to more than this many times their zipped size are refused as zip bombs, past 1 MB
+MAX_COMPRESSION_RATIO = 100
+BOMB_MIN_BYTES = 1024 * 1024
+
+
+def unzip_member(archive, info, limit):
+    """A spooled temporary file holding member `info` of `archive`.
+
+    Raises ValueError as soon as more than `limit` bytes come out, whatever size
+    the archive claims for the member.
+    """
+    spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_BYTES)
+    size = 0
+    with archive.open(info) as member:
+        while True:
+            data = member.read(min(READ_SIZE, limit + 1 - size))
+            if not data:
+                break
+            size += len(data)
+            if size > limit:
+                spool.close()
+                raise ValueError(f"{info.filename} unzips to over {limit / 2**20:.1f} MB.")
+            spool.write(data)
+    spool.seek(0)
+    return spool
+
+
+def archive_members(file, limits):
+    """An UploadFile for every CV inside the zip `file`, skipping folders and hidden files.
+
+    Each CV is unzipped into its own spooled temporary file, one at a time, so
+    however many there are, at most SPOOL_BYTES of each is held in memory.
+    Raises ValueError for a CV over the limit in `limits` for its type (checked
+    against the size the archive gives before unpacking it, then while
+    unpacking), for a likely zip bomb, or for a CV not of its type.
+    """
+    try:
+        with zipfile.ZipFile(file.file) as archive:
+            for info in archive.infolist():
+                name = os.path.basename(info.filename)
+                if info.is_dir() or name.startswith(".") or not name.lower().endswith(CV_EXTENSIONS):
+                    continue
+                ext = name.split('.')[-1].lower()
+                limit = limits.get(ext)
+                if limit and info.file_size > limit:
+                    raise ValueError(f"{file.filename}: {info.filename} is over the {limit / 2**20:.1f} MB limit for {ext.upper()} files.")
+                if info.file_size > BOMB_MIN_BYTES and info.file_size > MAX_COMPRESSION_RATIO * info.compress_size:
+                    raise ValueError(f"{file.filename}: {info.filename} is compressed over {MAX_COMPRESSION_RATIO} times; it is refused as a likely zip bomb.")
+                try:
+                    spool = unzip_member(archive, info, limit or info.file_size)
+                except ValueError as e:
+                    raise ValueError(f"{file.filename}: {e}")
+                head = spool.read(SNIFF_BYTES)
+                spool.seek(0)
+                if not sniff(head, ext):
+                    spool.close()
+                    raise ValueError(f"{file.filename}: {info.filename} is not a {ext.upper()} file.")
+                yield UploadFile(file=spool, filename=info.filename)
+    except (zipfile.BadZipFile, zlib.error) as e:
+        raise ValueError(f"{file.filename}: {e}")
+
+
+def expand_uploads(files, max_files, limits=None):
+    """The CVs in `files`, with each .zip replaced by the CVs inside it.
+
+    Raises ValueError for a broken archive, more than `max_files` CVs in all, or
+    a CV over its type's limit in `limits` or not of its type.
+    """
+    limits = limits or {}
+    uploads = []
+    for file in files:
+        if file.filename.lower().endswith(".zip"):
+            members = archive_members(file, limits)
+        else:
+            problem = check_upload(file, limits)
+            if problem:
+                raise ValueError(problem[1])
+            members = [file]
+        for upload in members:
+            if len(uploads) == max_files:
+                raise ValueError(f"At most {max_files} CVs can be matched at once.")
+            uploads.append(upload)
+    return uploads
@@ -0,0 +1,313 @@
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import httpx
+from .stubs import LATENCY, StubServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TARGETS = {
+    "job_matcher": os.path.join(ROOT, "job_matcher", "api", "src"),
+    "specific_job": os.path.join(ROOT, "specific_job", "api", "src"),
+    "gateway": None,
+}
+# Upper bounds of the latency histogram buckets, in milliseconds
+BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000)
+# Concurrency within this share of a setting's best throughput counts as saturated
+SATURATION = 0.9
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class App:
+    """One of the FastAPI apps under uvicorn with `workers` processes, on a free local port."""
+
+    def __init__(self, cwd, app, workers, env):
+        self.workers = workers
+        self.port = free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", app, "--host", "127.0.0.1", "--port", str(self.port),
+             "--workers", str(workers), "--log-level", "warning"],
+            cwd=cwd, env={**os.environ, **env},
+        )
+
+    def wait_ready(self, timeout=300):
+        """Wait until the app has warmed up, so that runs measure only the requests.
+
+        Each poll is a new connection, which any server worker may take, so the
+        app counts as ready once several in a row find a ready worker.
+        """
+        deadline = time.monotonic() + timeout
+        streak = 0
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"App exited with status {self.process.returncode}")
+            try:
+                ready = httpx.get(self.url + "/health/ready", timeout=2).status_code == 200
+            except httpx.HTTPError:
+                ready = False
+            streak = streak + 1 if ready else 0
+            if streak >= 3 * self.workers:
+                return
+            time.sleep(0.1 if ready else 0.5)
+        raise RuntimeError(f"App not ready on {self.url} after {timeout}s")
+
+    def stop(self):
+        self.process.terminate()
+        try:
+            self.process.wait(30)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+
+
+class Recorder:
+    """Latency and outcome of every request, per endpoint."""
+
+    def __init__(self):
+        self.requests = {}
+
+    def add(self, endpoint, seconds, outcome):
+        self.requests.setdefault(endpoint, []).append((seconds, outcome))
+
+    def report(self, elapsed):
+        return {endpoint: summary(requests, elapsed) for endpoint, requests in self.requests.items()}
+
+
+def summary(requests, elapsed):
+    ok = sorted(seconds for seconds, outcome in requests if outcome == 200)
+    outcomes = {}
+    for _, outcome in requests:
+        outcomes[str(outcome)] = outcomes.get(str(outcome), 0) + 1
+    latency = {"mean": round(sum(ok) / len(ok) * 1000, 1) if ok else None}
+    for p in (50, 90, 99):
+        latency[f"p{p}"] = round(ok[max(0, -(-len(ok) * p // 100) - 1)] * 1000, 1) if ok else None
+    latency["max"] = round(ok[-1] * 1000, 1) if ok else None
+    counts = [0] * (len(BUCKETS_MS) + 1)
+    for seconds in ok:
+        counts[next((i for i, bound in enumerate(BUCKETS_MS) if seconds * 1000 <= bound), len(BUCKETS_MS))] += 1
+    return {
+        "requests": len(requests),
+        "ok": len(ok),
+        "error_rate": round(1 - len(ok) / len(requests), 4) if requests else None,
+        "outcomes": outcomes,
+        "throughput_rps": round(len(ok) / elapsed, 2) if elapsed else None,
+        "latency_ms": latency,
+        "histogram": [{"le_ms": bound, "count": count} for bound, count in zip(BUCKETS_MS + ("inf",), counts)],
+    }
+
+
+async def timed(recorder, endpoint, request):
+    start = time.perf_counter()
+    try:
+        response = await request
+        outcome = response.status_code
+    except httpx.HTTPError as e:
+        response, outcome = None, type(e).__name__
+    recorder.add(endpoint, time.perf_counter() - start, outcome)
+    return response
+
+
+def cv_scenario(target, cvs, form):
+    """A coroutine function sending the `n`th CV to `target`'s /cv/inference."""
+    if target == "job_matcher":
+        cvs = [cv for cv in cvs if cv[0].endswith(".pdf")]
+
+    async def scenario(client, recorder, n):
+        name, content = cvs[n % len(cvs)]
+        await timed(recorder, "POST /cv/inference", client.post("/cv/inference", files={"file": (name, content)}, data=form))
+    return scenario
+
+
+def gateway_scenario(topic, subtopics):
+    """A coroutine function starting an interview on the gateway, then finishing it."""
+    async def scenario(client, recorder, n):
+        data = {"user_id": f"loadtest-{n}", "topic": topic, "subtopics": subtopics}
+        response = await timed(recorder, "POST /interviews/start", client.post("/interviews/start", data=data))
+        if response is not None and response.status_code == 200:
+            interview_id = response.json()["interview_id"]
+            await timed(recorder, "POST /interviews/finish", client.post(f"/interviews/finish/{interview_id}"))
+    return scenario
+
+
+async def drive(url, scenario, concurrency, duration, timeout):
+    """Run `scenario` back to back in `concurrency` loops for `duration` seconds; (recorder, elapsed)."""
+    recorder = Recorder()
+    counter = iter(range(sys.maxsize))
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, timeout=timeout, limits=limits) as client:
+        start = time.perf_counter()
+        deadline = start + duration
+
+        async def user():
+            while time.perf_counter() < deadline:
+                await scenario(client, recorder, next(counter))
+
+        await asyncio.gather(*(user() for _ in range(concurrency)))
+    return recorder, time.perf_counter() - start
+
+
+def saturation(runs):
+    """For each target and worker setting, the concurrency at which throughput stops growing."""
+    series = {}
+    for run in runs:
+        series.setdefault((run["target"], run["workers"], run["pool_processes"]), []).append(run)
+    points = []
+    for (target, workers, pool_processes), levels in series.items():
+        throughput = [sum(e["throughput_rps"] or 0 for e in run["endpoints"].values()) for run in levels]
+        best = max(throughput)
+        knee = next(run for run, rps in zip(levels, throughput) if rps >= SATURATION * best)
+        failing = next((run["concurrency"] for run in levels if max(e["error_rate"] or 0 for e in run["endpoints"].values()) > 0.01), None)
+        points.append({
+            "target": target, "workers": workers, "pool_processes": pool_processes,
+            "saturation_concurrency": knee["concurrency"],
+            "peak_throughput_rps": best,
+            "p50_ms_at_saturation": max((e["latency_ms"]["p50"] or 0) for e in knee["endpoints"].values()),
+            "errors_from_concurrency": failing,
+        })
+    return points
+
+
+def load_cvs(directory):
+    cvs = []
+    for name in sorted(os.listdir(directory)):
+        if name.lower().endswith((".pdf", ".docx", ".txt")):
+            with open(os.path.join(directory, name), "rb") as f:
+                cvs.append((name, f.read()))
+    return cvs
+
+
+def synthetic_cvs(count):
+    """CVs written by the job_matcher benchmark's generator, so every run sends the same files."""
+    directory = tempfile.mkdtemp(prefix="loadtest-cvs-")
+    subprocess.run(
+        [sys.executable, "-m", "services.benchmark.synthetic", directory, "--scales", "1", "--cvs", str(count)],
+        cwd=TARGETS["job_matcher"], check=True, stdout=subprocess.DEVNULL,
+    )
+    return load_cvs(os.path.join(directory, "cvs"))
+
+
+def parse_latency(values, unit="SECONDS"):
+    latency = {}
+    for value in values:
+        name, _, seconds = value.partition("=")
+        if name not in LATENCY or not seconds:
+            raise argparse.ArgumentTypeError(f"expected NAME={unit} with NAME one of {', '.join(LATENCY)}, got {value!r}")
+        latency[name] = float(seconds)
+    return latency
+
+
+def print_table(runs, points):
+    print(f"{'target':<13} {'workers':>7} {'pool':>4} {'conc':>5} {'endpoint':<24} {'rps':>8} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7}", file=sys.stderr)
+    for run in runs:
+        for endpoint, stats in run["endpoints"].items():
+            print(
+                f"{run['target']:<13} {run['workers']:>7} {str(run['pool_processes']):>4} {run['concurrency']:>5} {endpoint:<24} "
+                f"{stats['throughput_rps']:>8} {str(stats['latency_ms']['p50']):>8} {str(stats['latency_ms']['p99']):>8} {stats['error_rate']:>7.2%}",
+                file=sys.stderr,
+            )
+    for point in points:
+        print(
+            f"{point['target']} with {point['workers']} workers, pool {point['pool_processes']}: saturates at concurrency "
+            f"{point['saturation_concurrency']} ({point['peak_throughput_rps']} req/s peak)"
+            + (f", errors from {point['errors_from_concurrency']}" if point["errors_from_concurrency"] else ""),
+            file=sys.stderr,
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test the job matching apps and the interview gateway on this machine.")
+    parser.add_argument("--targets", nargs="+", choices=list(TARGETS), default=["job_matcher", "specific_job"])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 3], help="uvicorn worker processes to try")
+    parser.add_argument("--pool-processes", type=int, nargs="+", default=[0, 2], help="WORKER_PROCESSES to try for the matching apps")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32], help="requests kept in flight")
+    parser.add_argument("--duration", type=float, default=20, help="seconds at each concurrency")
+    parser.add_argument("--warmup", type=float, default=5, help="seconds of unrecorded requests after each start")
+    parser.add_argument("--timeout", type=float, default=120, help="seconds before a request counts as failed")
+    parser.add_argument("--cvs", help="directory of CVs to upload (default: synthetic ones)")
+    parser.add_argument("--cv-cache", action="store_true", help="leave the apps' CV cache on (by default every upload is parsed)")
+    parser.add_argument("--job", nargs=3, default=[".NET Developer", "Cairo", "fresh"], metavar=("TITLE", "GOVERNORATE", "LEVEL"), help="job for specific_job")
+    parser.add_argument("--gateway-dir", help="directory holding the gateway's `app` package")
+    parser.add_argument("--gateway-app", default="app.main:app", help="uvicorn import path of the gateway")
+    parser.add_argument("--stub-latency", nargs="+", default=[], metavar="NAME=SECONDS", help=f"stand-in delays (default: {', '.join(f'{k}={v}' for k, v in LATENCY.items())})")
+    parser.add_argument("--stub-failures", nargs="+", default=[], metavar="NAME=SHARE", help="share of a stand-in's requests answered 503 (default: none)")
+    parser.add_argument("--output", help="JSON report file (default: stdout)")
+    args = parser.parse_args(argv)
+    if "gateway" in args.targets and not args.gateway_dir:
+        parser.error("--gateway-dir is needed to start the gateway")
+    try:
+        latency = parse_latency(args.stub_latency)
+        failures = parse_latency(args.stub_failures, "SHARE")
+    except argparse.ArgumentTypeError as e:
+        parser.error(str(e))
+
+    cvs = load_cvs(args.cvs) if args.cvs else synthetic_cvs(24)
+    cache_env = {} if args.cv_cache else {"CV_CACHE_SIZE": "0", "CV_CACHE_DIR": ""}
+    stubs = StubServer(latency=latency, failures=failures).start() if "gateway" in args.targets else None
+    runs = []
+    try:
+        for target in args.targets:
+            if target == "gateway":
+                settings = [(workers, None) for workers in args.workers]
+                scenario = gateway_scenario("machine learning", "python, statistics")
+            else:
+                settings = [(workers, pool) for workers in args.workers for pool in args.pool_processes]
+                form = {"top_k": "3"} if target == "job_matcher" else dict(zip(("job_title", "governorate", "level"), args.job))
+                scenario = cv_scenario(target, cvs, form)
+            for workers, pool in settings:
+                if target == "gateway":
+                    app = App(args.gateway_dir, args.gateway_app, workers, stubs.env())
+                else:
+                    app = App(TARGETS[target], "main:app", workers, {**cache_env, "WORKER_PROCESSES": str(pool)})
+                try:
+                    app.wait_ready()
+                    print(f"{target}: {workers} workers, pool {pool}", file=sys.stderr)
+                    asyncio.run(drive(app.url, scenario, max(args.concurrency), args.warmup, args.timeout))
+                    for concurrency in args.concurrency:
+                        recorder, elapsed = asyncio.run(drive(app.url, scenario, concurrency, args.duration, args.timeout))
+                        runs.append({
+                            "target": target, "workers": workers, "pool_processes": pool, "concurrency": concurrency,
+                            "seconds": round(elapsed, 2), "endpoints": recorder.report(elapsed),
+                        })
+                finally:
+                    app.stop()
+    finally:
+        if stubs is not None:
+            stubs.stop()
+
+    points = saturation(runs)
+    report = {
+        "environment": {
+            "created": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "settings": {
+            "duration": args.duration, "warmup": args.warmup, "timeout": args.timeout, "cvs": len(cvs),
+            "cv_cache": args.cv_cache, "stub_latency": stubs.latency if stubs else None,
+            "stub_failures": stubs.failures if stubs else None,
+        },
+        "stub_calls": stubs.calls if stubs else None,
+        "runs": runs,
+        "saturation": points,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    print_table(runs, points)
@@ -0,0 +1,130 @@
+import json
+import math
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Seconds each stand-in takes to answer, unless overridden
+LATENCY = {"llm": 0.5, "tts": 0.3, "audio": 0.05, "avatar": 1.0, "gemini": 2.0}
+AUDIO_BYTES = 32 * 1024
+
+
+def route(method, path):
+    """Which stand-in answers `method path`, or None."""
+    if method == "POST" and path in ("/start_interview", "/next_question"):
+        return "llm"
+    if method == "POST" and path == "/tts":
+        return "tts"
+    if method == "GET" and path.startswith("/audio/"):
+        return "audio"
+    if method == "POST" and path == "/sync":
+        return "avatar"
+    if method == "POST" and path.split("?")[0].endswith(":generateContent"):
+        return "gemini"
+    return None
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        self.server.count("connections")
+
+    def do_GET(self):
+        self.answer("GET")
+
+    def do_POST(self):
+        self.answer("POST")
+
+    def answer(self, method):
+        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        name = route(method, self.path)
+        if name is None:
+            return self.send(404, b'{"detail": "Not Found"}')
+        calls = self.server.count(name)
+        time.sleep(self.server.latency[name])
+        share = self.server.failures.get(name, 0)
+        if math.ceil(calls * share) > math.ceil((calls - 1) * share):
+            self.server.count("failures")
+            return self.send(503, b'{"detail": "Service Unavailable"}')
+        base = f"http://{self.headers.get('Host')}"
+        if name == "audio":
+            return self.send(200, b"\0" * AUDIO_BYTES, "audio/mpeg")
+        if self.path == "/start_interview":
+            body = {"session_id": uuid.uuid4().hex, "first_question": "Walk me through a project you are proud of."}
+        elif self.path == "/next_question":
+            body = {"question": "How would you test that?"}
+        elif name == "tts":
+            body = {"audio_url": f"{base}/audio/{uuid.uuid4().hex}.mp3"}
+        elif name == "avatar":
+            body = {"video_url": f"{base}/video/{uuid.uuid4().hex}.mp4"}
+        else:
+            body = {"candidates": [{"content": {"parts": [{"text": "You answered clearly and with good examples."}]}}]}
+        self.send(200, json.dumps(body).encode("utf-8"))
+
+    def send(self, status, body, content_type="application/json"):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubServer(ThreadingHTTPServer):
+    """The LLM, TTS, avatar and Gemini endpoints the interview gateway calls, answering after a fixed delay.
+
+    Every stand-in is served from the one port; `env()` gives the gateway
+    settings that point it here. `failures` is the share of each one's requests
+    answered 503 instead, spread evenly from its first request on. `calls`
+    counts the requests each one got, the connections opened and the failures
+    sent.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, port=0, latency=None, failures=None):
+        super().__init__(("127.0.0.1", port), StubHandler)
+        self.latency = {**LATENCY, **(latency or {})}
+        self.failures = dict(failures or {})
+        self.calls = {**dict.fromkeys(self.latency, 0), "connections": 0, "failures": 0}
+        self.lock = threading.Lock()
+        self.thread = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def count(self, name):
+        """Count a call to `name`; returns how many it has had."""
+        with self.lock:
+            self.calls[name] += 1
+            return self.calls[name]
+
+    def handle_error(self, request, client_address):
+        # Callers that timed out have hung up before their answer; that is no error here
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+    def env(self):
+        return {
+            "LLM_URL": self.url,
+            "TTS_URL": self.url,
+            "AVATAR_URL": self.url,
+            "GEMINI_ENDPOINT": f"{self.url}/v1beta/models/gemini-2.0-flash:generateContent",
+            "GEMINI_API_KEY": "stub",
+        }
+
+    def start(self):
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
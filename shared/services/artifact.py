@@ -0,0 +1,198 @@
+import contextlib
+import hashlib
+import json
+import mmap
+import os
+import struct
+import tempfile
+import zlib
+import numpy as np
+
+MAGIC = b"JOBINDEX"
+FORMAT_VERSION = 2
+# magic, format version, table-of-contents length, sha256 of everything after the header
+HEADER = struct.Struct("<8sII32s")
+ALIGNMENT = 64
+
+
+def pack_strings(values):
+    encoded = [value.encode("utf-8") for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(value) for value in encoded], dtype=np.int64)
+    return offsets, np.frombuffer(b"".join(encoded), dtype=np.uint8)
+
+
+def string_hashes(values):
+    return np.fromiter((zlib.crc32(value.encode("utf-8")) for value in values), dtype=np.uint32, count=len(values))
+
+
+def source_stamp(path):
+    stat = os.stat(path)
+    return {"source_size": stat.st_size, "source_mtime_ns": stat.st_mtime_ns}
+
+
+def source_version(stamp):
+    """Short string naming a `source_stamp` (or index metadata carrying one)."""
+    return "{source_size}-{source_mtime_ns}".format(**stamp)
+
+
+class StringTable:
+    """Read-only sequence of strings decoded on access from packed UTF-8 bytes."""
+
+    def __init__(self, offsets, data):
+        self.offsets = offsets
+        self.data = data
+        self.size = len(offsets) - 1
+        self.view = memoryview(data)
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, i):
+        i = int(i)
+        if i < 0:
+            i += self.size
+        if not 0 <= i < self.size:
+            raise IndexError(i)
+        return str(self.view[self.offsets.item(i):self.offsets.item(i + 1)], "utf-8")
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+
+class StringIndex:
+    """Read-only str -> id mapping kept entirely in arrays.
+
+    Ids are positions in `strings`; lookups binary-search the sorted CRC32 hashes and
+    confirm the string, so a mapping opened from an index file costs no per-process
+    dict however large the vocabulary is.
+    """
+
+    def __init__(self, strings, hashes, order):
+        self.strings = strings
+        self.hashes = hashes
+        self.order = order
+
+    @classmethod
+    def build(cls, strings):
+        hashes = string_hashes(strings)
+        order = np.argsort(hashes, kind="stable").astype(np.int32)
+        return cls(strings, hashes[order], order)
+
+    @classmethod
+    def from_artifact(cls, artifact, name):
+        return cls(artifact.strings(name), artifact.array(name + ".hashes"), artifact.array(name + ".order"))
+
+    @classmethod
+    def arrays(cls, name, mapping):
+        index = mapping if isinstance(mapping, cls) else cls.build(list(mapping))
+        return {name: list(index.strings), name + ".hashes": index.hashes, name + ".order": index.order}
+
+    def get(self, key, default=None):
+        value = zlib.crc32(key.encode("utf-8"))
+        i = int(self.hashes.searchsorted(value))
+        while i < len(self.hashes) and self.hashes.item(i) == value:
+            if self.strings[self.order.item(i)] == key:
+                return self.order.item(i)
+            i += 1
+        return default
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def __len__(self):
+        return len(self.strings)
+
+    def __iter__(self):
+        return iter(self.strings)
+
+
+@contextlib.contextmanager
+def atomic_open(path, mode="w", **kwargs):
+    """Open a temporary file next to `path` that replaces it only once fully written."""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), prefix=".tmp-")
+    try:
+        with os.fdopen(fd, mode, **kwargs) as f:
+            yield f
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def write_artifact(path, arrays, meta=None):
+    """Write named arrays (or lists of str) to `path` as a versioned, checksummed index file.
+
+    Every array is stored raw and 64-byte aligned so `Artifact` can hand out zero-copy
+    views of a read-only mmap. `path` is replaced atomically.
+    """
+    sections = {}
+    for name, value in arrays.items():
+        if isinstance(value, (list, tuple, StringTable)):
+            sections[name + ".offsets"], sections[name + ".data"] = pack_strings(value)
+        else:
+            sections[name] = np.ascontiguousarray(value)
+
+    toc = {"meta": meta or {}, "arrays": {}}
+    offset = 0
+    for name, array in sections.items():
+        toc["arrays"][name] = {"dtype": array.dtype.str, "shape": list(array.shape), "offset": offset}
+        offset += -(-array.nbytes // ALIGNMENT) * ALIGNMENT
+    toc_bytes = json.dumps(toc).encode("utf-8")
+    toc_bytes += b" " * (-(HEADER.size + len(toc_bytes)) % ALIGNMENT)
+
+    digest = hashlib.sha256(toc_bytes)
+    for array in sections.values():
+        digest.update(array.tobytes())
+        digest.update(b"\0" * (-array.nbytes % ALIGNMENT))
+
+    with atomic_open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, len(toc_bytes), digest.digest()))
+        f.write(toc_bytes)
+        for array in sections.values():
+            f.write(array.tobytes())
+            f.write(b"\0" * (-array.nbytes % ALIGNMENT))
+
+
+class Artifact:
+    """Read-only mmap of an index file written by `write_artifact`."""
+
+    def __init__(self, path, verify=True):
+        self.path = path
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size < HEADER.size:
+                raise ValueError(f"Not a job index file: {path}")
+            self.buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, toc_size, checksum = HEADER.unpack_from(self.buffer)
+        if magic != MAGIC:
+            raise ValueError(f"Not a job index file: {path}")
+        if version != FORMAT_VERSION:
+            raise ValueError(f"Unsupported job index version {version} in {path} (expected {FORMAT_VERSION})")
+        if verify and hashlib.sha256(memoryview(self.buffer)[HEADER.size:]).digest() != checksum:
+            raise ValueError(f"Checksum mismatch in {path}")
+        toc = json.loads(bytes(self.buffer[HEADER.size:HEADER.size + toc_size]))
+        self.meta = toc["meta"]
+        self.sections = toc["arrays"]
+        self.payload_offset = HEADER.size + toc_size
+
+    def __contains__(self, name):
+        return name in self.sections or name + ".offsets" in self.sections
+
+    def array(self, name):
+        section = self.sections[name]
+        dtype = np.dtype(section["dtype"])
+        count = int(np.prod(section["shape"], dtype=np.int64))
+        if not count:
+            return np.empty(section["shape"], dtype=dtype)
+        array = np.frombuffer(self.buffer, dtype=dtype, count=count, offset=self.payload_offset + section["offset"])
+        return array.reshape(section["shape"])
+
+    def strings(self, name):
+        return StringTable(self.array(name + ".offsets"), self.array(name + ".data"))
+
+    def is_stale(self, source_path):
+        if not os.path.exists(source_path):
+            return False
+        stamp = source_stamp(source_path)
+        return any(self.meta.get(key) != value for key, value in stamp.items())
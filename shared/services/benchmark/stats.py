@@ -0,0 +1,119 @@
+import datetime
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+PERCENTILES = (50, 90, 99)
+
+
+def summary(seconds):
+    """Latency percentiles in milliseconds and calls per second for a list of timings."""
+    ordered = sorted(seconds)
+    total = sum(ordered)
+    stats = {"count": len(ordered), "mean_ms": round(total / len(ordered) * 1000, 3) if ordered else None}
+    for p in PERCENTILES:
+        # Nearest rank, so every reported value is one that was measured
+        stats[f"p{p}_ms"] = round(ordered[max(0, -(-len(ordered) * p // 100) - 1)] * 1000, 3) if ordered else None
+    stats["max_ms"] = round(ordered[-1] * 1000, 3) if ordered else None
+    stats["per_second"] = round(len(ordered) / total, 2) if total else None
+    return stats
+
+
+class Stages:
+    """Timings of named stages, each call timed on its own."""
+
+    def __init__(self):
+        self.seconds = {}
+
+    def run(self, name, fn, *args, **kwargs):
+        start = time.perf_counter()
+        result = fn(*args, **kwargs)
+        self.seconds.setdefault(name, []).append(time.perf_counter() - start)
+        return result
+
+    def report(self):
+        return {name: summary(seconds) for name, seconds in self.seconds.items()}
+
+
+def measured(fn, *args, **kwargs):
+    """(result, load stats): `fn`'s wall time and this process's peak memory before and after it."""
+    before = peak_rss()
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, {"seconds": round(time.perf_counter() - start, 3), "rss_before_bytes": before, "peak_rss_bytes": peak_rss()}
+
+
+def peak_rss():
+    """Largest resident set of this process so far, in bytes."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def isolated(fn, *args):
+    """`fn(*args)` in a fresh process, so its peak memory is not that of earlier runs."""
+    with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context("spawn")) as executor:
+        return executor.submit(fn, *args).result()
+
+
+def environment():
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, timeout=10,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        "commit": commit,
+        "created": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def compare(baseline, report):
+    """Lines comparing the median of every stage, and load time and memory, with `baseline`'s.
+
+    Figures missing from either report are skipped, so reports from older commits still compare.
+    """
+    old_scales = {entry["scale"]: entry for entry in baseline.get("scales", [])}
+    lines = [f"{'scale':>6} {'stage':<24} {'baseline':>10} {'current':>10} {'change':>8}"]
+    for entry in report["scales"]:
+        old = old_scales.get(entry["scale"])
+        if old is None:
+            continue
+        rows = [
+            ("load s", old["load"].get("seconds"), entry["load"].get("seconds")),
+            ("load peak RSS MB", megabytes(old["load"].get("peak_rss_bytes")), megabytes(entry["load"].get("peak_rss_bytes"))),
+            ("peak RSS MB", megabytes(old.get("peak_rss_bytes")), megabytes(entry.get("peak_rss_bytes"))),
+        ]
+        rows += [
+            (f"{name} p50 ms", old["stages"].get(name, {}).get("p50_ms"), stats["p50_ms"])
+            for name, stats in entry["stages"].items()
+        ]
+        for name, before, after in rows:
+            if before is None or after is None:
+                continue
+            change = f"{(after - before) / before:+.1%}" if before else "n/a"
+            lines.append(f"{entry['scale']:>6} {name:<24} {before:>10.3f} {after:>10.3f} {change:>8}")
+    return lines
+
+
+def megabytes(size):
+    return None if size is None else size / 2**20
+
+
+def write_report(report, path=None):
+    text = json.dumps(report, indent=2)
+    if path:
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
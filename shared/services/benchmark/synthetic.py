@@ -0,0 +1,210 @@
+import argparse
+import csv
+import io
+import os
+import docx
+import numpy as np
+import pandas as pd
+from ..catalog import CSV_HEADER, JobCatalog
+
+SCALES = (1, 10, 100, 1000)
+CV_FORMATS = ("txt", "docx", "pdf")
+# Words in a CV's target length, cycled through so every format gets short and long CVs
+CV_LENGTHS = (150, 400, 900, 1800)
+# Share of a job's skills kept from the real job it is copied from
+KEEP_SKILLS = 0.8
+# Jobs generated at a time, which bounds the memory used at 1000x
+CHUNK_JOBS = 50000
+
+FILLER = (
+    "worked closely with the team to deliver projects on time and within budget",
+    "responsible for day to day operations and reporting to senior stakeholders",
+    "improved internal processes and documented them for new joiners",
+    "collaborated with clients to gather requirements and present results",
+    "mentored junior colleagues and ran weekly knowledge sharing sessions",
+    "took ownership of planning, estimation and follow up with other departments",
+    "handled escalations and kept customers informed until issues were resolved",
+    "prepared monthly reports and dashboards for the management team",
+)
+SECTIONS = ("Profile", "Experience", "Projects", "Education", "Training", "Activities")
+
+
+def source_catalog(path):
+    return JobCatalog.from_frame(pd.read_csv(path))
+
+
+def synthetic_jobs(catalog, scale, seed=0):
+    """Yield `scale` times as many (title, level, governorate, skills) jobs as `catalog` has live.
+
+    Each job copies a random real job's governorate and level and about
+    KEEP_SKILLS of its skills, so the skills that go together keep going together;
+    the rest are drawn by how often each skill is listed across the catalogue, which
+    keeps the number of skills per job and the long tail of rare skills. Copies after
+    the first get a numbered title, so distinct titles grow with the catalogue.
+    """
+    rng = np.random.default_rng(seed)
+    live = np.flatnonzero(catalog.live)
+    count = len(live) * scale
+    sources = live[rng.permutation(count) % len(live)]
+    frequencies = catalog.skill_counts().astype(np.float64)
+    frequencies /= frequencies.sum()
+    columns = [catalog.columns[name] for name, _ in CSV_HEADER]
+    names = catalog.skills
+    for start in range(0, count, CHUNK_JOBS):
+        chunk = sources[start:start + CHUNK_JOBS]
+        skills, bounds = skill_rows(catalog, chunk, frequencies, rng)
+        for job, source in enumerate(chunk.tolist()):
+            title, level, governorate = (column[source] for column in columns)
+            copy = (start + job) // len(live)
+            if copy:
+                title = f"{title} {copy}"
+            yield title, level, governorate, ", ".join(names[i] for i in skills[bounds[job]:bounds[job + 1]].tolist())
+
+
+def skill_rows(catalog, sources, frequencies, rng):
+    """(skill ids, CSR bounds) of new jobs copied from the jobs `sources`."""
+    # The source job's skills, most kept, then as many drawn as were dropped
+    indptr = catalog.job_skills_indptr
+    lengths = np.diff(indptr)[sources]
+    starts = np.repeat(indptr[sources] - np.cumsum(lengths) + lengths, lengths)
+    skills = catalog.job_skills[starts + np.arange(lengths.sum())]
+    kept = rng.random(len(skills)) < KEEP_SKILLS
+    jobs = np.repeat(np.arange(len(sources)), lengths)
+    drawn = np.bincount(jobs[~kept], minlength=len(sources))
+    jobs = np.concatenate([jobs[kept], np.repeat(np.arange(len(sources)), drawn)])
+    skills = np.concatenate([skills[kept], rng.choice(len(frequencies), drawn.sum(), p=frequencies)])
+
+    # Group by job, keeping the first of any skill drawn twice
+    _, first = np.unique(jobs.astype(np.int64) * len(frequencies) + skills, return_index=True)
+    first.sort()
+    order = np.argsort(jobs[first], kind="stable")
+    return skills[first][order], np.searchsorted(jobs[first][order], np.arange(len(sources) + 1))
+
+
+def write_jobs(catalog, scale, path, seed=0):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow([header for _, header in CSV_HEADER] + ["skills"])
+        writer.writerows(synthetic_jobs(catalog, scale, seed))
+    return path
+
+
+def synthetic_cv(catalog, words, rng):
+    """Lines of a CV of about `words` words, built around a random job's skills."""
+    row = int(rng.choice(np.flatnonzero(catalog.live)))
+    job = catalog.job(row)
+    skills = list(catalog.skills_of(row))
+    rng.shuffle(skills)
+    listed = skills[:max(3, len(skills) * 2 // 3)]
+    others = [catalog.skills[i] for i in rng.choice(len(catalog.skills), 5, replace=False)]
+    lines = [
+        "Candidate " + str(int(rng.integers(1000, 9999))),
+        f"{job['title']} - {job['governorate']}",
+        "Skills",
+        ", ".join(listed + others),
+    ]
+    count = sum(len(line.split()) for line in lines)
+    while count < words:
+        lines.append(SECTIONS[int(rng.integers(len(SECTIONS)))])
+        for _ in range(int(rng.integers(2, 6))):
+            sentence = FILLER[int(rng.integers(len(FILLER)))]
+            if rng.random() < 0.5:
+                sentence += " using " + skills[int(rng.integers(len(skills)))]
+            lines.append(sentence[0].upper() + sentence[1:] + ".")
+            count += len(sentence.split())
+    return lines
+
+
+def docx_bytes(lines):
+    document = docx.Document()
+    for line in lines:
+        document.add_paragraph(line)
+    buffer = io.BytesIO()
+    document.save(buffer)
+    return buffer.getvalue()
+
+
+def pdf_bytes(lines, width=90, per_page=55):
+    """A plain PDF of `lines` in Helvetica, wrapped at `width` characters."""
+    wrapped = []
+    for line in lines:
+        while len(line) > width:
+            cut = line.rfind(" ", 0, width)
+            cut = cut if cut > 0 else width
+            wrapped.append(line[:cut])
+            line = line[cut:].lstrip()
+        wrapped.append(line)
+    pages = [wrapped[i:i + per_page] for i in range(0, len(wrapped), per_page)] or [[]]
+
+    # Objects: 1 catalog, 2 page tree, 3 font, then a page and its content stream per page
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for page in pages:
+        text = b" T* ".join(b"(" + pdf_escape(line) + b") Tj" for line in page)
+        stream = b"BT /F1 10 Tf 12 TL 50 800 Td " + text + b" ET"
+        kids.append(len(objects) + 1)
+        objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % (len(objects) + 2))
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (b" ".join(b"%d 0 R" % kid for kid in kids), len(kids))
+
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(out.tell())
+        out.write(b"%d 0 obj\n" % number + body + b"\nendobj\n")
+    xref = out.tell()
+    out.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+    out.writelines(b"%010d 00000 n \n" % offset for offset in offsets)
+    out.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref))
+    return out.getvalue()
+
+
+def pdf_escape(line):
+    return line.encode("latin-1", "replace").replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)")
+
+
+def cv_bytes(lines, fmt):
+    if fmt == "txt":
+        return "\n".join(lines).encode("utf-8")
+    if fmt == "docx":
+        return docx_bytes(lines)
+    if fmt == "pdf":
+        return pdf_bytes(lines)
+    raise ValueError(f"Unknown CV format {fmt!r}, expected one of {', '.join(CV_FORMATS)}")
+
+
+def synthetic_cvs(catalog, count, formats=CV_FORMATS, seed=0):
+    """[(filename, content)] for `count` CVs of every length in CV_LENGTHS, spread over `formats`."""
+    rng = np.random.default_rng(seed)
+    cvs = []
+    for i in range(count):
+        fmt = formats[i % len(formats)]
+        words = CV_LENGTHS[i // len(formats) % len(CV_LENGTHS)]
+        cvs.append((f"cv_{i:04d}_{words}w.{fmt}", cv_bytes(synthetic_cv(catalog, words, rng), fmt)))
+    return cvs
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write synthetic job catalogues and CVs shaped like job_data.csv.")
+    parser.add_argument("output", help="directory for jobs_<scale>x.csv and cvs/")
+    parser.add_argument("--data", default=os.path.join("static", "job_data.csv"), help="catalogue to imitate")
+    parser.add_argument("--scales", type=int, nargs="+", default=list(SCALES), help="catalogue sizes, in multiples of --data")
+    parser.add_argument("--cvs", type=int, default=48, help="CVs to write")
+    parser.add_argument("--formats", nargs="+", choices=CV_FORMATS, default=list(CV_FORMATS))
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    catalog = source_catalog(args.data)
+    os.makedirs(os.path.join(args.output, "cvs"), exist_ok=True)
+    for scale in args.scales:
+        path = write_jobs(catalog, scale, os.path.join(args.output, f"jobs_{scale}x.csv"), args.seed)
+        print(f"Wrote {path}: {catalog.live_count() * scale} jobs")
+    for name, content in synthetic_cvs(catalog, args.cvs, args.formats, args.seed):
+        with open(os.path.join(args.output, "cvs", name), "wb") as f:
+            f.write(content)
+    print(f"Wrote {args.cvs} CVs to {os.path.join(args.output, 'cvs')}")
+
+
+if __name__ == "__main__":
+    main()
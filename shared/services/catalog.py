@@ -0,0 +1,300 @@
+import csv
+import numpy as np
+from .artifact import StringIndex, atomic_open
+
+COLUMNS = ("title", "governorate", "level")
+# CSV header for each column, in the order job_data.csv lists them
+CSV_HEADER = (("title", "Job Title"), ("level", "professional level"), ("governorate", "Governorate"))
+
+
+def job_key(title, governorate, level):
+    return (title.strip().lower(), governorate.strip().lower(), level.strip().lower())
+
+
+class JobLookup:
+    """Normalised key -> the job rows with that key, in row order.
+
+    Kept as a `StringIndex` over the distinct keys plus CSR row lists so it can be
+    stored in (and shared from) the index file; rows added by `JobCatalog.updated`
+    go in the `extra` dict until the catalog is next written out.
+    """
+
+    def __init__(self, keys, indptr, rows, extra=None):
+        self.keys = keys
+        self.indptr = indptr
+        self.rows = rows
+        self.extra = extra or {}
+
+    @classmethod
+    def build(cls, row_keys):
+        groups = {}
+        for row, key in enumerate(row_keys):
+            groups.setdefault(key, []).append(row)
+        indptr = np.zeros(len(groups) + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum([len(rows) for rows in groups.values()], dtype=np.int64)
+        rows = np.fromiter((row for rows in groups.values() for row in rows), dtype=np.int32, count=indptr[-1])
+        return cls(StringIndex.build(list(groups)), indptr, rows)
+
+    @classmethod
+    def from_artifact(cls, artifact, name):
+        return cls(StringIndex.from_artifact(artifact, name), artifact.array(name + ".indptr"), artifact.array(name + ".rows"))
+
+    def to_arrays(self, name):
+        return {**StringIndex.arrays(name, self.keys), name + ".indptr": self.indptr, name + ".rows": self.rows}
+
+    def with_rows(self, added):
+        """Lookup that also has `added` ({key: [row, ...]}, rows past every existing one)."""
+        extra = {key: list(rows) for key, rows in self.extra.items()}
+        for key, rows in added.items():
+            extra.setdefault(key, []).extend(rows)
+        return JobLookup(self.keys, self.indptr, self.rows, extra)
+
+    def get(self, key):
+        i = self.keys.get(key)
+        rows = [] if i is None else self.rows[self.indptr[i]:self.indptr[i + 1]].tolist()
+        return rows + self.extra.get(key, [])
+
+    def first(self, key, live):
+        for row in self.get(key):
+            if live[row]:
+                return row
+        return None
+
+
+class Categorical:
+    """Column of strings stored as an int32 code per row into its distinct `values`."""
+
+    def __init__(self, values, codes, value_ids=None):
+        self.values = values
+        self.codes = codes
+        self.value_ids = value_ids
+
+    @classmethod
+    def build(cls, strings):
+        value_ids = {}
+        codes = np.fromiter((value_ids.setdefault(s, len(value_ids)) for s in strings), dtype=np.int32, count=len(strings))
+        return cls(list(value_ids), codes, value_ids)
+
+    @classmethod
+    def from_artifact(cls, artifact, name):
+        if name + ".codes" not in artifact:
+            # Index files from before columns were coded store every row's string
+            return cls.build(list(artifact.strings(name)))
+        return cls(artifact.strings(name + ".values"), artifact.array(name + ".codes"))
+
+    def to_arrays(self, name):
+        return {name + ".values": list(self.values), name + ".codes": self.codes}
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, row):
+        return self.values[self.codes[row]]
+
+    def __iter__(self):
+        values = self.values
+        return (values[code] for code in self.codes.tolist())
+
+    def normalized(self):
+        """The stripped, lowercased value of every row."""
+        values = [value.strip().lower() for value in self.values]
+        return [values[code] for code in self.codes.tolist()]
+
+    def extended(self, strings):
+        """Column with rows for `strings` appended, adding the values not seen before."""
+        if self.value_ids is None:
+            self.value_ids = {value: i for i, value in enumerate(self.values)}
+        value_ids = dict(self.value_ids)
+        codes = np.fromiter((value_ids.setdefault(s, len(value_ids)) for s in strings), dtype=np.int32, count=len(strings))
+        values = list(self.values) + list(value_ids)[len(self.values):]
+        return Categorical(values, np.concatenate([self.codes, codes]), value_ids)
+
+
+class JobCatalog:
+    """Job postings as flat columns plus a CSR list of skill ids per job.
+
+    `skills` is the skill vocabulary; the skills of job `row` are
+    `skills[job_skills[job_skills_indptr[row]:job_skills_indptr[row + 1]]]` in the
+    order they were listed. The title, governorate and level columns are
+    `Categorical`s, an int32 code per job into the column's distinct values, so a
+    job costs a few integers whether it was read from the CSV or opened from the
+    mmap of a compiled index; strings are only looked up for a response.
+
+    Catalogs are never modified in place: `updated` returns a new one. Deleted and
+    replaced jobs stay behind as rows with `live` unset so row numbers are stable.
+    `by_key` and `by_title` find the rows for a normalised (title, governorate,
+    level) or title without scanning the columns.
+    """
+
+    def __init__(self, skills, job_skills_indptr, job_skills, columns, live=None, by_key=None, by_title=None):
+        self.skills = skills
+        self.job_skills_indptr = job_skills_indptr
+        self.job_skills = job_skills
+        self.columns = columns
+        self.live = np.ones(len(job_skills_indptr) - 1, dtype=bool) if live is None else live
+        if by_key is None:
+            by_key = JobLookup.build(self.key_strings())
+        if by_title is None:
+            by_title = JobLookup.build(self.columns["title"].normalized())
+        self.by_key = by_key
+        self.by_title = by_title
+
+    @classmethod
+    def from_frame(cls, df):
+        level_column = 'professional level' if 'professional level' in df.columns else 'professional Level'
+        rows = [[s.strip() for s in str(skill_text).split(',')] for skill_text in df['skills']]
+        skills = sorted(set(s for row in rows for s in row))
+        skill_ids = {skill: i for i, skill in enumerate(skills)}
+        rows = [[skill_ids[s] for s in row if s] for row in rows]
+        indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum([len(row) for row in rows], dtype=np.int64)
+        job_skills = np.fromiter((i for row in rows for i in row), dtype=np.int32, count=indptr[-1])
+        columns = {
+            "title": Categorical.build([str(v) for v in df['Job Title']]),
+            "governorate": Categorical.build([str(v) for v in df['Governorate']]),
+            "level": Categorical.build([str(v) for v in df[level_column]]),
+        }
+        return cls(skills, indptr, job_skills, columns)
+
+    @classmethod
+    def from_artifact(cls, artifact):
+        return cls(
+            artifact.strings("catalog.skills"),
+            artifact.array("catalog.job_skills_indptr"),
+            artifact.array("catalog.job_skills"),
+            {name: Categorical.from_artifact(artifact, "catalog." + name) for name in COLUMNS},
+            artifact.array("catalog.live") if "catalog.live" in artifact else None,
+            JobLookup.from_artifact(artifact, "catalog.by_key") if "catalog.by_key" in artifact else None,
+            JobLookup.from_artifact(artifact, "catalog.by_title") if "catalog.by_title" in artifact else None,
+        )
+
+    def to_arrays(self):
+        arrays = {
+            "catalog.skills": list(self.skills),
+            "catalog.job_skills_indptr": self.job_skills_indptr,
+            "catalog.job_skills": self.job_skills,
+            "catalog.live": self.live,
+        }
+        for name, column in self.columns.items():
+            arrays.update(column.to_arrays("catalog." + name))
+        by_key, by_title = self.by_key, self.by_title
+        if by_key.extra or by_title.extra:
+            by_key = JobLookup.build(self.key_strings())
+            by_title = JobLookup.build(self.columns["title"].normalized())
+        arrays.update(by_key.to_arrays("catalog.by_key"))
+        arrays.update(by_title.to_arrays("catalog.by_title"))
+        return arrays
+
+    def __len__(self):
+        return len(self.job_skills_indptr) - 1
+
+    def skills_of(self, row):
+        ids = self.job_skills[self.job_skills_indptr[row]:self.job_skills_indptr[row + 1]]
+        return [self.skills[i] for i in ids]
+
+    def skill_lists(self):
+        return [self.skills_of(row) for row in range(len(self))]
+
+    def job(self, row):
+        return {name: values[row] for name, values in self.columns.items()}
+
+    def key(self, row):
+        return job_key(*(self.columns[name][row] for name in COLUMNS))
+
+    def key_string(self, row):
+        return "\x1f".join(self.key(row))
+
+    def key_strings(self):
+        """`key_string` of every row."""
+        return ["\x1f".join(key) for key in zip(*(self.columns[name].normalized() for name in COLUMNS))]
+
+    def live_count(self):
+        return int(np.count_nonzero(self.live))
+
+    def find(self, title, governorate=None, level=None):
+        """First live row whose normalised title (and governorate/level, when given) match."""
+        if governorate is not None and level is not None:
+            return self.by_key.first("\x1f".join((title, governorate, level)), self.live)
+        wanted = {"governorate": governorate, "level": level}
+        wanted = {name: value for name, value in wanted.items() if value is not None}
+        for row in self.by_title.get(title):
+            if self.live[row] and all(self.columns[name][row].strip().lower() == value for name, value in wanted.items()):
+                return row
+        return None
+
+    def skill_counts(self, live=None):
+        """Number of live jobs listing each vocabulary skill."""
+        live = self.live if live is None else live
+        lengths = np.diff(self.job_skills_indptr)
+        return np.bincount(self.job_skills[np.repeat(live, lengths)], minlength=len(self.skills))
+
+    def updated(self, upserts=(), deletes=()):
+        """Catalog with the jobs keyed by `deletes` removed and `upserts` added or replaced.
+
+        `upserts` are dicts with title, governorate, level and a list of skills; a job
+        is identified by its normalised (title, governorate, level). Returns the new
+        catalog and a dict of what changed: the rows removed and added, and the keys
+        that were updated, added, deleted and not found.
+        """
+        upserts = {job_key(job["title"], job["governorate"], job["level"]): job for job in upserts}
+        deletes = set(job_key(*key) for key in deletes) - set(upserts)
+        removed = []
+        existing = set()
+        for key in set(upserts) | deletes:
+            rows = [row for row in self.by_key.get("\x1f".join(key)) if self.live[row]]
+            if rows:
+                existing.add(key)
+                removed.extend(rows)
+
+        skills = list(self.skills)
+        skill_ids = {skill: i for i, skill in enumerate(skills)}
+        rows = []
+        for job in upserts.values():
+            row = []
+            for skill in job["skills"]:
+                skill = skill.strip()
+                if not skill:
+                    continue
+                if skill not in skill_ids:
+                    skill_ids[skill] = len(skills)
+                    skills.append(skill)
+                row.append(skill_ids[skill])
+            rows.append(row)
+
+        live = np.concatenate([self.live, np.ones(len(rows), dtype=bool)])
+        live[removed] = False
+        indptr = np.concatenate([
+            self.job_skills_indptr,
+            self.job_skills_indptr[-1] + np.cumsum([len(row) for row in rows], dtype=np.int64),
+        ])
+        job_skills = np.concatenate([self.job_skills, np.fromiter((i for row in rows for i in row), dtype=np.int32)])
+        columns = {
+            name: column.extended([str(job[name]) for job in upserts.values()])
+            for name, column in self.columns.items()
+        }
+        added_keys = {}
+        added_titles = {}
+        for row, key in enumerate(upserts, start=len(self)):
+            added_keys.setdefault("\x1f".join(key), []).append(row)
+            added_titles.setdefault(key[0], []).append(row)
+        catalog = JobCatalog(
+            skills, indptr, job_skills, columns, live,
+            self.by_key.with_rows(added_keys), self.by_title.with_rows(added_titles),
+        )
+        changes = {
+            "removed": np.asarray(sorted(removed), dtype=np.int64),
+            "added": np.arange(len(self), len(catalog), dtype=np.int64),
+            "updated": sorted(existing & set(upserts)),
+            "inserted": sorted(set(upserts) - existing),
+            "deleted": sorted(existing & deletes),
+            "not_found": sorted(deletes - existing),
+        }
+        return catalog, changes
+
+    def write_csv(self, path):
+        """Write the live jobs back out in job_data.csv's layout."""
+        with atomic_open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow([header for _, header in CSV_HEADER] + ["skills"])
+            for row in np.flatnonzero(self.live).tolist():
+                writer.writerow([self.columns[name][row] for name, _ in CSV_HEADER] + [", ".join(self.skills_of(row))])
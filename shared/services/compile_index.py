@@ -0,0 +1,18 @@
+import argparse
+import os
+from .main import Matcher
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compile job_data.csv into a memory-mappable job index.")
+    parser.add_argument("--data", default=None, help="source CSV (defaults to static/job_data.csv)")
+    parser.add_argument("--output", default=os.path.join("static", "job_index.bin"), help="index file to write")
+    args = parser.parse_args(argv)
+
+    matcher = Matcher(data_path=args.data)
+    matcher.save_index(args.output)
+    print(f"Wrote {args.output}: {len(matcher.catalog)} jobs, {len(matcher.all_skills)} skills")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+import collections
+import hashlib
+import json
+import os
+import threading
+from .artifact import atomic_open
+from . import metrics
+
+CHUNK_SIZE = 1 << 20
+LOOKUPS = metrics.counter("cv_cache_lookups_total", "CV cache lookups by where the entry was found.", "result", ("memory", "disk", "miss"))
+
+
+def upload_key(fileobj, ext):
+    """SHA-256 of the file type and the upload's bytes; leaves `fileobj` rewound."""
+    digest = hashlib.sha256(ext.lower().encode("utf-8") + b"\0")
+    fileobj.seek(0)
+    for chunk in iter(lambda: fileobj.read(CHUNK_SIZE), b""):
+        digest.update(chunk)
+    fileobj.seek(0)
+    return digest.hexdigest()
+
+
+class CVCache:
+    """Extracted CV text and skills by content hash: an LRU in memory over an optional directory.
+
+    Entries are dicts with the CV `text`, the `version` of the jobs the skills were
+    extracted against and the `skill_ids`. The directory tier is shared by every
+    worker pointed at it and is trimmed, oldest use first, to `max_disk_bytes`.
+    """
+
+    def __init__(self, max_entries=256, directory=None, max_disk_bytes=256 << 20):
+        self.max_entries = max_entries
+        self.directory = directory
+        self.max_disk_bytes = max_disk_bytes
+        self.entries = collections.OrderedDict()
+        self.lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.disk_bytes = 0
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            self.disk_bytes = sum(size for _, size, _ in self.disk_files())
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+                self.memory_hits += 1
+                LOOKUPS.inc("memory")
+                return entry
+        entry = self.read(key)
+        with self.lock:
+            if entry is None:
+                self.misses += 1
+                LOOKUPS.inc("miss")
+                return None
+            self.disk_hits += 1
+            LOOKUPS.inc("disk")
+        self.remember(key, entry)
+        return entry
+
+    def put(self, key, entry):
+        self.remember(key, entry)
+        if self.directory:
+            self.write(key, entry)
+
+    def remember(self, key, entry):
+        if self.max_entries <= 0:
+            return
+        with self.lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def path(self, key):
+        return os.path.join(self.directory, key + ".json")
+
+    def read(self, key):
+        if not self.directory:
+            return None
+        try:
+            with open(self.path(key), encoding="utf-8") as f:
+                entry = json.load(f)
+            os.utime(self.path(key))
+        except (OSError, ValueError):
+            return None
+        return entry
+
+    def write(self, key, entry):
+        with atomic_open(self.path(key), "w", encoding="utf-8") as f:
+            json.dump(entry, f)
+            size = f.tell()
+        with self.lock:
+            self.disk_bytes += size
+            if self.disk_bytes <= self.max_disk_bytes:
+                return
+            # Other workers write here too, so recount before evicting
+            files = sorted(self.disk_files(), key=lambda file: file[2])
+            self.disk_bytes = sum(size for _, size, _ in files)
+            for path, size, _ in files:
+                if self.disk_bytes <= self.max_disk_bytes:
+                    break
+                try:
+                    os.unlink(path)
+                except OSError:
+                    continue
+                self.disk_bytes -= size
+
+    def disk_files(self):
+        """(path, size, last used) of every entry on disk."""
+        files = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".json"):
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                files.append((entry.path, stat.st_size, stat.st_mtime_ns))
+        return files
+
+    def stats(self):
+        with self.lock:
+            return {
+                "entries": len(self.entries),
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "disk_bytes": self.disk_bytes,
+            }
@@ -0,0 +1,281 @@
+import codecs
+import concurrent.futures
+import io
+import math
+import multiprocessing
+import os
+import posixpath
+import re
+import time
+import zipfile
+from xml.parsers import expat
+
+WORD = "http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+RELATIONSHIPS = "http://schemas.openxmlformats.org/package/2006/relationships}"
+OFFICE_DOCUMENT = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"
+# Text boxes are written twice, as drawing and as VML in a Fallback; only the first is read
+FALLBACK = "http://schemas.openxmlformats.org/markup-compatibility/2006}Fallback"
+PARAGRAPH, RUN, TEXT = WORD + "p", WORD + "r", WORD + "t"
+BREAKS = {WORD + "br", WORD + "cr"}
+TAB = WORD + "tab"
+HEADER_PART = re.compile(r"^word/header\d*\.xml$")
+FOOTER_PART = re.compile(r"^word/footer\d*\.xml$")
+READ_SIZE = 64 * 1024
+# Unzipped size of the parts read, so a small upload cannot expand into gigabytes of XML
+MAX_XML_BYTES = 64 * 2**20
+# Shorter PDFs are read where they are opened, as handing them out would cost more than it saves
+PARALLEL_MIN_PAGES = 16
+# Every task parses the PDF's structure again, so each process gets only this many ranges of pages
+TASKS_PER_PROCESS = 2
+
+
+def reject_doctype(*args):
+    raise ValueError("DOCX parts must not declare a DOCTYPE")
+
+
+class ParagraphReader:
+    """Incremental parser of a WordprocessingML part, collecting the text of each paragraph as it ends.
+
+    Text comes from runs anywhere in the part, so tables, text boxes, content
+    controls and hyperlinks are read as well as body paragraphs. Documents with a
+    DOCTYPE are rejected, as Word never writes one and its entities could expand
+    without bound.
+    """
+
+    def __init__(self):
+        self.parser = expat.ParserCreate(namespace_separator="}")
+        self.parser.buffer_text = True
+        self.parser.StartElementHandler = self.start
+        self.parser.EndElementHandler = self.end
+        self.parser.CharacterDataHandler = self.characters
+        self.parser.StartDoctypeDeclHandler = reject_doctype
+        self.tags = []
+        self.text = []
+        self.paragraphs = []
+        self.in_text = False
+        self.skipping = 0
+
+    def feed(self, data, final=False):
+        self.parser.Parse(data, final)
+
+    def take(self):
+        """Paragraphs finished since the last call, each ending in a newline."""
+        paragraphs, self.paragraphs = self.paragraphs, []
+        return paragraphs
+
+    def start(self, tag, attributes):
+        if tag == FALLBACK:
+            self.skipping += 1
+        elif not self.skipping:
+            if tag == TEXT:
+                self.in_text = True
+            elif tag == TAB:
+                # Tab stops in paragraph properties share the name
+                if self.tags and self.tags[-1] == RUN:
+                    self.text.append("\t")
+            elif tag in BREAKS:
+                self.text.append("\n")
+        self.tags.append(tag)
+
+    def end(self, tag):
+        self.tags.pop()
+        if tag == FALLBACK:
+            self.skipping -= 1
+        elif tag == TEXT:
+            self.in_text = False
+        elif tag == PARAGRAPH and not self.skipping:
+            self.text.append("\n")
+            self.paragraphs.append("".join(self.text))
+            self.text = []
+
+    def characters(self, data):
+        if self.in_text and not self.skipping:
+            self.text.append(data)
+
+
+def part_chunks(stream):
+    """Yield the paragraphs of the WordprocessingML part `stream` as it is read."""
+    reader = ParagraphReader()
+    while True:
+        data = stream.read(READ_SIZE)
+        reader.feed(data, final=not data)
+        yield from reader.take()
+        if not data:
+            return
+
+
+def main_part(archive):
+    """Name of the main document part: word/document.xml, unless the package says otherwise."""
+    names = set(archive.namelist())
+    if "word/document.xml" in names:
+        return "word/document.xml"
+    if "_rels/.rels" in names:
+        found = []
+
+        def start(tag, attributes):
+            if tag == RELATIONSHIPS + "Relationship" and attributes.get("Type") == OFFICE_DOCUMENT:
+                found.append(attributes.get("Target", ""))
+
+        parser = expat.ParserCreate(namespace_separator="}")
+        parser.StartDoctypeDeclHandler = reject_doctype
+        parser.StartElementHandler = start
+        parser.Parse(archive.read("_rels/.rels"), True)
+        for target in found:
+            name = posixpath.normpath(target.lstrip("/"))
+            if name in names:
+                return name
+    raise ValueError("Not a DOCX file: it has no main document part")
+
+
+def docx_chunks(file):
+    """Yield the text of the DOCX in `file` (a seekable binary file) a paragraph at a time.
+
+    Headers come first, then the body (tables included), then footers, each part
+    streamed out of the zip and parsed as it is decompressed.
+    """
+    with zipfile.ZipFile(file) as archive:
+        names = archive.namelist()
+        parts = sorted(filter(HEADER_PART.match, names)) + [main_part(archive)] + sorted(filter(FOOTER_PART.match, names))
+        size = sum(archive.getinfo(name).file_size for name in parts)
+        if size > MAX_XML_BYTES:
+            raise ValueError(f"DOCX text is too large: {size // 2**20} MB unzipped, the limit is {MAX_XML_BYTES // 2**20} MB")
+        for name in parts:
+            with archive.open(name) as stream:
+                yield from part_chunks(stream)
+
+
+def txt_chunks(file):
+    """Yield the UTF-8 text of `file` as it is read, READ_SIZE bytes at a time."""
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    while True:
+        data = file.read(READ_SIZE)
+        yield decoder.decode(data, final=not data)
+        if not data:
+            return
+
+
+def pdf_pages(data, start, stop):
+    """Text of pages `start` to `stop` of the PDF in `data`, as a `PagePool` task."""
+    import PyPDF2
+    reader = PyPDF2.PdfReader(io.BytesIO(data))
+    return [reader.pages[i].extract_text() or "" for i in range(start, stop)]
+
+
+def import_parser(_):
+    import PyPDF2  # noqa: F401
+
+
+class PagePool:
+    """Processes to read the pages of long PDFs across, in ranges handed out in order."""
+
+    def __init__(self, processes):
+        self.processes = processes
+        self.executor = concurrent.futures.ProcessPoolExecutor(processes, mp_context=multiprocessing.get_context("forkserver"))
+
+    def warm_up(self):
+        """Start every process and import the PDF parser in it."""
+        list(self.executor.map(import_parser, range(self.processes)))
+
+    def submit(self, data, count):
+        """Futures of the text of the first `count` pages of the PDF in `data`, a list of pages each."""
+        size = max(math.ceil(count / (self.processes * TASKS_PER_PROCESS)), PARALLEL_MIN_PAGES // 2)
+        return [self.executor.submit(pdf_pages, data, start, min(start + size, count)) for start in range(0, count, size)]
+
+
+class PdfText:
+    """The text of the PDF in `file` (a seekable binary file), a page at a time, within limits.
+
+    Files over `max_bytes` are refused. Only the first `max_pages` pages are read,
+    and no page is started once `budget` seconds have passed since opening; 0 is
+    no limit. `stats` says how many pages were read of how many, and which limit
+    cut the document short, if one did. With a `PagePool`, PDFs of
+    PARALLEL_MIN_PAGES pages or more are read across it, still yielded in order.
+    """
+
+    def __init__(self, file, max_pages=0, max_bytes=0, budget=0, pool=None):
+        self.started = time.monotonic()
+        file.seek(0, os.SEEK_END)
+        size = file.tell()
+        file.seek(0)
+        if max_bytes and size > max_bytes:
+            raise ValueError(f"PDF is too large: {size / 2**20:.1f} MB, the limit is {max_bytes / 2**20:.1f} MB")
+        import PyPDF2
+        self.file = file
+        self.reader = PyPDF2.PdfReader(file)
+        total = len(self.reader.pages)
+        self.count = min(total, max_pages) if max_pages else total
+        self.budget = budget
+        self.pool = pool
+        self.stats = {"pages": 0, "total_pages": total, "truncated": "pages" if self.count < total else None}
+
+    def __iter__(self):
+        deadline = self.started + self.budget if self.budget else None
+        if self.pool is not None and self.count >= PARALLEL_MIN_PAGES:
+            return self.read_parallel(deadline)
+        return self.read_serial(deadline)
+
+    def read_serial(self, deadline):
+        for i in range(self.count):
+            if deadline is not None and time.monotonic() > deadline:
+                self.stats["truncated"] = "time"
+                return
+            text = self.reader.pages[i].extract_text() or ""
+            self.stats["pages"] += 1
+            yield text
+
+    def read_parallel(self, deadline):
+        self.file.seek(0)
+        data = self.file.read()
+        futures = self.pool.submit(data, self.count)
+        try:
+            for future in futures:
+                try:
+                    texts = future.result(None if deadline is None else max(deadline - time.monotonic(), 0))
+                except concurrent.futures.TimeoutError:
+                    self.stats["truncated"] = "time"
+                    return
+                for text in texts:
+                    self.stats["pages"] += 1
+                    yield text
+        finally:
+            # Tasks already running finish in the background, but their results are dropped
+            for future in futures:
+                future.cancel()
+
+
+class TextReader:
+    """Iterates over the chunks `open_chunks()` returns, keeping them and the seconds spent producing them.
+
+    Whoever consumes the chunks, the time spent parsing is told apart from theirs.
+    """
+
+    def __init__(self, open_chunks):
+        self.open_chunks = open_chunks
+        self.source = None
+        self.chunks = []
+        self.seconds = 0.0
+
+    def __iter__(self):
+        start = time.perf_counter()
+        try:
+            self.source = self.open_chunks()
+            chunks = iter(self.source)
+        finally:
+            self.seconds += time.perf_counter() - start
+        while True:
+            start = time.perf_counter()
+            try:
+                chunk = next(chunks, None)
+            finally:
+                self.seconds += time.perf_counter() - start
+            if chunk is None:
+                return
+            self.chunks.append(chunk)
+            yield chunk
+
+    def text(self):
+        return "".join(self.chunks)
+
+    def stats(self):
+        """Characters read and milliseconds spent on it, with the source's own `stats` if it has any."""
+        return {"chars": sum(map(len, self.chunks)), "ms": round(self.seconds * 1000, 1), **getattr(self.source, "stats", {})}
@@ -0,0 +1,184 @@
+import copy
+import re
+import numpy as np
+from .artifact import StringIndex, string_hashes
+
+# Maximal runs of word / non-word characters, using the same \w class that re uses for \b
+RUN_PATTERN = re.compile(r'\w+|\W+')
+
+
+def is_word_run(run):
+    return run[0].isalnum() or run[0] == '_'
+
+
+def build_table(skills):
+    """First run -> [(pattern runs, skill id), ...] for (skill id, skill) pairs, plus the ids of empty skills."""
+    table = {}
+    match_any = []
+    for skill_id, skill in skills:
+        runs = tuple(RUN_PATTERN.findall(skill.lower()))
+        if not runs:
+            # An empty pattern (r'\b\b') matches any text with a word character in it
+            match_any.append(skill_id)
+            continue
+        table.setdefault(runs[0], []).append((runs, skill_id))
+    return table, match_any
+
+
+class SkillExtractor:
+    """Finds every vocabulary skill in a text in one pass over its runs.
+
+    A skill matches exactly where re.search(r'\\b' + re.escape(skill) + r'\\b', text)
+    would: a \\b-delimited match always starts and ends on a word/non-word run
+    boundary, so the text only has to be split once and looked up run by run in a
+    table keyed on each skill's first run.
+
+    Built from a vocabulary the table is a dict; opened from an index file it stays
+    in the file's arrays (see `from_artifact`) so workers share it instead of each
+    holding a copy. `updated` layers skills added later over either table, and hides
+    skills no job lists any more, without rebuilding it.
+    """
+
+    def __init__(self, skills):
+        self.skills = skills
+        self.table, self.match_any = build_table(enumerate(skills))
+        self.keys = None
+        self.extra = {}
+        self.removed = frozenset()
+
+    @classmethod
+    def from_artifact(cls, artifact):
+        extractor = cls.__new__(cls)
+        extractor.skills = artifact.strings("extractor.skills")
+        extractor.table = None
+        extractor.keys = StringIndex.from_artifact(artifact, "extractor.keys")
+        extractor.entries_indptr = artifact.array("extractor.entries_indptr")
+        extractor.entries = artifact.array("extractor.entries")
+        extractor.match_any = artifact.array("extractor.match_any").tolist()
+        extractor.extra = {}
+        extractor.removed = frozenset()
+        return extractor
+
+    def updated(self, skills, removed=()):
+        """Extractor over `skills`, a longer copy of this vocabulary, ignoring the ids in `removed`."""
+        extractor = copy.copy(self)
+        extractor.skills = skills
+        extractor.extra = {key: list(entries) for key, entries in self.extra.items()}
+        extractor.match_any = list(self.match_any)
+        table, match_any = build_table((i, skills[i]) for i in range(len(self.skills), len(skills)))
+        for key, entries in table.items():
+            extractor.extra.setdefault(key, []).extend(entries)
+        extractor.match_any.extend(match_any)
+        extractor.removed = frozenset(removed)
+        return extractor
+
+    def to_arrays(self):
+        if self.extra or self.removed:
+            table, match_any = build_table((i, s) for i, s in enumerate(self.skills) if i not in self.removed)
+        else:
+            table, match_any = self.table, self.match_any
+        if table is None:
+            keys, indptr, entries = self.keys, self.entries_indptr, self.entries
+        else:
+            keys = list(table)
+            indptr = np.zeros(len(keys) + 1, dtype=np.int64)
+            indptr[1:] = np.cumsum([len(table[key]) for key in keys])
+            entries = np.asarray([skill_id for key in keys for _, skill_id in table[key]], dtype=np.int32)
+        return {
+            "extractor.skills": list(self.skills),
+            **StringIndex.arrays("extractor.keys", keys),
+            "extractor.entries_indptr": indptr,
+            "extractor.entries": entries,
+            "extractor.match_any": np.asarray(match_any, dtype=np.int32),
+        }
+
+    def lookup(self, runs):
+        """(position, [(pattern runs, skill id), ...]) for every run that starts a skill."""
+        if self.extra:
+            extra = self.extra
+            yield from ((i, extra[run]) for i, run in enumerate(runs) if run in extra)
+        if self.table is not None:
+            table = self.table
+            yield from ((i, table[run]) for i, run in enumerate(runs) if run in table)
+            return
+        hits = np.flatnonzero(np.isin(string_hashes(runs), self.keys.hashes))
+        seen = {}
+        for i in hits:
+            run = runs[i]
+            if run not in seen:
+                seen[run] = self.candidates(run)
+            yield i, seen[run]
+
+    def candidates(self, run):
+        key = self.keys.get(run)
+        if key is None:
+            return []
+        skill_ids = self.entries[self.entries_indptr[key]:self.entries_indptr[key + 1]]
+        return [(tuple(RUN_PATTERN.findall(self.skills[i].lower())), int(i)) for i in skill_ids]
+
+    def find(self, text):
+        if not text:
+            return set()
+        runs = RUN_PATTERN.findall(text.lower())
+        found = set()
+        self.scan(runs, found)
+        if self.match_any and any(is_word_run(run) for run in runs):
+            found.update(self.match_any)
+        return found - self.removed if self.removed else found
+
+    def find_chunks(self, chunks):
+        """`find` over the text the strings in `chunks` make up, taking one at a time.
+
+        Only the runs at the end of a chunk that a skill might continue past it are
+        kept for the next, so the text is never held whole.
+        """
+        found = set()
+        runs = []
+        first = True
+        any_word = False
+        for chunk in chunks:
+            if not chunk:
+                continue
+            # The last run may continue in this chunk, so it is split again with it
+            tail = runs.pop() if runs else ""
+            new = RUN_PATTERN.findall(tail + chunk.lower())
+            any_word = any_word or (bool(self.match_any) and any(is_word_run(run) for run in new))
+            runs.extend(new)
+            keep = self.scan(runs, found, first, final=False)
+            if keep:
+                first = False
+                del runs[:keep]
+        self.scan(runs, found, first)
+        if any_word:
+            found.update(self.match_any)
+        return found - self.removed if self.removed else found
+
+    def scan(self, runs, found, first=True, final=True):
+        """Add the skills in `runs` to `found`; returns where the runs a later chunk could still extend start.
+
+        `first` says `runs` starts the text and `final` that it ends it. Unless
+        final, matches running into the last run (which may go on) are left for the
+        next call.
+        """
+        last = len(runs)
+        keep = last if final else max(last - 1, 0)
+        for i, candidates in self.lookup(runs):
+            for pattern, skill_id in candidates:
+                end = i + len(pattern)
+                if skill_id in found:
+                    continue
+                if end > last or (end == last and not final):
+                    if not final:
+                        keep = min(keep, i)
+                    continue
+                # A leading/trailing non-word run needs a word character on its outer side
+                if i == 0 and first and not is_word_run(pattern[0]):
+                    continue
+                if end == last and not is_word_run(pattern[-1]):
+                    continue
+                if len(pattern) == 1 or tuple(runs[i:end]) == pattern:
+                    found.add(skill_id)
+        return keep
+
+    def extract(self, text):
+        return [self.skills[skill_id] for skill_id in self.find(text)]
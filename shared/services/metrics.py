@@ -0,0 +1,112 @@
+import contextlib
+import os
+import threading
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# Upper bounds in seconds of the histogram buckets; the +Inf one is implied
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+FAMILIES = []
+lock = threading.Lock()
+
+
+class Family:
+    """A prometheus_client counter or histogram with one series per declared value of an optional label.
+
+    The prometheus_client metrics are made on first use, so that
+    `use_directory`, called after the families are declared, can still have
+    their values kept in files. Values of the label that were not declared are
+    ignored, so recording a metric never fails a request.
+    """
+
+    kind = None
+
+    def __init__(self, name, help, label=None, values=(None,), buckets=()):
+        self.name = name
+        self.help = help
+        self.label = label
+        self.values = tuple(values)
+        self.buckets = tuple(buckets)
+        self.series = None
+        FAMILIES.append(self)
+
+    def get(self, value):
+        if self.series is None:
+            create()
+        return self.series.get(value)
+
+    def create(self, prometheus_client):
+        labels = (self.label,) if self.label else ()
+        if self.kind == "counter":
+            metric = prometheus_client.Counter(self.name, self.help, labels)
+        else:
+            metric = prometheus_client.Histogram(self.name, self.help, labels, buckets=self.buckets)
+        self.series = {value: metric.labels(value) if self.label else metric for value in self.values}
+
+
+class Counter(Family):
+    kind = "counter"
+
+    def inc(self, value=None, amount=1):
+        series = self.get(value)
+        if series is not None:
+            series.inc(amount)
+
+
+class Histogram(Family):
+    kind = "histogram"
+
+    def observe(self, seconds, value=None):
+        series = self.get(value)
+        if series is not None:
+            series.observe(seconds)
+
+    def time(self, value=None):
+        """Context manager observing the time spent in its block, whether or not it raised."""
+        series = self.get(value)
+        return contextlib.nullcontext() if series is None else series.time()
+
+
+def counter(name, help, label=None, values=(None,)):
+    return Counter(name, help, label, values)
+
+
+def histogram(name, help, label=None, values=(None,), buckets=BUCKETS):
+    return Histogram(name, help, label, values, buckets)
+
+
+def create():
+    """Make the prometheus_client metric of every family declared so far."""
+    import prometheus_client
+    with lock:
+        for family in FAMILIES:
+            if family.series is None:
+                family.create(prometheus_client)
+
+
+def use_directory(directory):
+    """Keep the metrics of this process, and of the processes it starts, in files in `directory`.
+
+    Every process of the app given the same directory (server workers and
+    their worker processes alike) reports the totals of all of them. Files of
+    exited processes are kept, so their counts are not lost. Call this before
+    any metric is recorded.
+    """
+    if any(family.series is not None for family in FAMILIES):
+        raise RuntimeError("Metrics directory set after metrics were first recorded")
+    os.makedirs(directory, exist_ok=True)
+    # prometheus_client picks where values are kept when first imported; worker processes inherit it
+    os.environ["PROMETHEUS_MULTIPROC_DIR"] = directory
+
+
+def exposition():
+    """Every metric in the Prometheus text format."""
+    import prometheus_client
+    from prometheus_client import multiprocess
+    create()
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = prometheus_client.CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = prometheus_client.REGISTRY
+    return prometheus_client.generate_latest(registry).decode("utf-8")
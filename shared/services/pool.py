@@ -0,0 +1,142 @@
+import asyncio
+import io
+import multiprocessing
+import signal
+
+
+class Upload:
+    """Stand-in for an UploadFile inside a worker process: its name and bytes."""
+
+    def __init__(self, filename, content):
+        self.filename = filename
+        self.file = io.BytesIO(content or b"")
+
+
+def serve(conn, initializer, initargs, started):
+    """Worker loop: build the state once, set `started`, then run `fn(state, *args)` for each call sent."""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    state = initializer(*initargs)
+    started.set()
+    while True:
+        try:
+            fn, args = conn.recv()
+        except EOFError:
+            return
+        try:
+            reply = (True, fn(state, *args))
+        except Exception as e:
+            reply = (False, e)
+        try:
+            conn.send(reply)
+        except Exception as e:
+            conn.send((False, RuntimeError(f"Could not send the result back: {e!r}")))
+
+
+class Worker:
+    def __init__(self, context, initializer, initargs):
+        self.conn, child = context.Pipe()
+        self.started = context.Event()
+        self.process = context.Process(target=serve, args=(child, initializer, initargs, self.started), daemon=True)
+        self.process.start()
+        child.close()
+
+    async def call(self, fn, args):
+        loop = asyncio.get_running_loop()
+        # Uploads can be large, so the pickling and writing happen off the loop
+        await loop.run_in_executor(None, self.conn.send, (fn, args))
+        ready = loop.create_future()
+        fd = self.conn.fileno()
+        loop.add_reader(fd, lambda: ready.done() or ready.set_result(None))
+        try:
+            await ready
+        finally:
+            loop.remove_reader(fd)
+        return self.conn.recv()
+
+    def kill(self):
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+
+class WorkerPool:
+    """Processes for CPU-bound calls, awaited from the event loop.
+
+    Each worker is built with `initializer(*initargs)` and then runs one
+    `fn(state, *args)` at a time, so `fn` and its arguments must pickle. Workers
+    start with `start`, or else on the first call. A call that runs past its
+    `timeout`, is cancelled or whose worker dies has that worker killed and
+    replaced, so abandoned work does not keep a core busy.
+    """
+
+    def __init__(self, size, initializer, initargs=(), start_method="forkserver"):
+        self.size = size
+        self.initializer = initializer
+        self.initargs = initargs
+        self.context = multiprocessing.get_context(start_method)
+        if start_method == "forkserver":
+            # Workers fork from a server that has imported the initializer's module once, rather than each importing it
+            self.context.set_forkserver_preload([initializer.__module__])
+        self.workers = None
+        self.idle = None
+
+    def start(self):
+        """Start the workers (and their initializers) without waiting for them."""
+        if self.workers is None:
+            self.workers = []
+            for _ in range(self.size):
+                self.start_worker()
+
+    def start_worker(self):
+        worker = Worker(self.context, self.initializer, self.initargs)
+        self.workers.append(worker)
+        return worker
+
+    def ready(self):
+        """Whether the workers are started and every one has finished its initializer."""
+        return self.workers is not None and all(worker.started.is_set() for worker in self.workers)
+
+    async def run(self, fn, *args, timeout=None):
+        """`fn(state, *args)` in the next free worker; `timeout` starts once it has one."""
+        if self.idle is None:
+            # Created here so the queue belongs to the running loop
+            self.start()
+            self.idle = asyncio.Queue()
+            for worker in self.workers:
+                self.idle.put_nowait(worker)
+        worker = await self.idle.get()
+        try:
+            ok, value = await asyncio.wait_for(worker.call(fn, args), timeout)
+        except BaseException:
+            self.discard(worker)
+            worker = None
+            raise
+        finally:
+            self.release(worker)
+        if not ok:
+            raise value
+        return value
+
+    def discard(self, worker):
+        worker.kill()
+        if self.workers is not None and worker in self.workers:
+            self.workers.remove(worker)
+
+    def release(self, worker):
+        """Return a worker after a call, replacing it if it was killed (None)."""
+        if self.idle is None:
+            # The pool was closed during the call
+            if worker is not None:
+                worker.kill()
+        else:
+            self.idle.put_nowait(worker or self.start_worker())
+
+    def close(self):
+        """Kill the idle workers; calls still running keep theirs until they finish."""
+        if self.idle is not None:
+            while not self.idle.empty():
+                self.idle.get_nowait().kill()
+        elif self.workers is not None:
+            for worker in self.workers:
+                worker.kill()
+        self.workers = self.idle = None
@@ -0,0 +1,211 @@
+import cProfile
+import datetime
+import functools
+import io
+import marshal
+import os
+import pstats
+import random
+import re
+import threading
+import time
+
+# How often, in seconds, a process looks again for a sample rate set by any worker
+RATE_CHECK = 1.0
+PROFILE_NAME = re.compile(r"^(\d{8}T\d{6}\.\d{6})-p(\d+)-(\d+)ms\.prof$")
+
+
+class Capture:
+    """The profile of one call, filled in by `unwrap` or `collect`."""
+
+    def __init__(self):
+        self.data = None
+        self.seconds = None
+        self.started = time.perf_counter()
+
+
+def profiled(fn, *args):
+    """(fn(*args), (its profile as pstats data, seconds it took))."""
+    profile = cProfile.Profile()
+    start = time.perf_counter()
+    try:
+        profile.enable()
+    except ValueError:
+        # From Python 3.12 one profiler runs at a time, so a call overlapping another goes unprofiled
+        return fn(*args), (None, None)
+    try:
+        value = fn(*args)
+    except BaseException as e:
+        profile.disable()
+        # Kept on the error (which pickles with it) for `collect`, as failing calls are often the ones worth seeing
+        e.profile = finish(profile, start)
+        raise
+    profile.disable()
+    return value, finish(profile, start)
+
+
+def finish(profile, start):
+    seconds = time.perf_counter() - start
+    profile.create_stats()
+    return marshal.dumps(profile.stats), seconds
+
+
+def wrap(fn, capture):
+    """`fn`, profiled when there is a `capture`. Pickles when `fn` does, so it can run in a `WorkerPool`."""
+    return fn if capture is None else functools.partial(profiled, fn)
+
+
+def unwrap(reply, capture):
+    """What the function given to `wrap` returned, keeping its profile in `capture`."""
+    if capture is None:
+        return reply
+    value, (capture.data, capture.seconds) = reply
+    return value
+
+
+async def collect(task, capture):
+    """`unwrap` of what `task` returns, also keeping the profile in `capture` when the call raised."""
+    try:
+        reply = await task
+    except Exception as e:
+        if capture is not None and getattr(e, "profile", None):
+            capture.data, capture.seconds = e.profile
+        raise
+    return unwrap(reply, capture)
+
+
+def placeholder(seconds):
+    """pstats data with one entry standing for a call whose profile never came back."""
+    return marshal.dumps({("~", 0, "<no profile: the call timed out, died or overlapped another profile>"): (1, 1, seconds, seconds, {})})
+
+
+class Profiler:
+    """Decides which requests to profile and keeps their profiles in a ring of files.
+
+    A request is profiled when asked for, or at random at the sample rate, which
+    starts at `sample_rate` and can be changed with `set_rate`. The rate is kept in
+    `directory` so every server worker follows it. Only the newest `keep` profiles
+    are kept. When nothing asks for profiling, deciding costs a clock read and a
+    comparison, and calls run unwrapped.
+    """
+
+    def __init__(self, directory, keep=50, sample_rate=0.0):
+        self.directory = directory
+        self.keep = keep
+        self.default_rate = sample_rate
+        self.current_rate = sample_rate
+        self.checked = None
+        self.lock = threading.Lock()
+
+    @property
+    def rate_path(self):
+        return os.path.join(self.directory, "sample_rate")
+
+    def rate(self):
+        now = time.monotonic()
+        if self.checked is None or now - self.checked >= RATE_CHECK:
+            self.checked = now
+            try:
+                with open(self.rate_path, encoding="utf-8") as f:
+                    self.current_rate = float(f.read())
+            except (OSError, ValueError):
+                self.current_rate = self.default_rate
+        return self.current_rate
+
+    def set_rate(self, rate):
+        """Profile this share of requests from now on, in every worker; None goes back to the configured rate."""
+        if rate is None:
+            try:
+                os.remove(self.rate_path)
+            except FileNotFoundError:
+                pass
+        else:
+            os.makedirs(self.directory, exist_ok=True)
+            temp = f"{self.rate_path}.{os.getpid()}"
+            with open(temp, "w", encoding="utf-8") as f:
+                f.write(repr(float(rate)))
+            os.replace(temp, self.rate_path)
+        self.checked = None
+        return self.rate()
+
+    def capture(self, requested=False):
+        """A `Capture` if this request is to be profiled, else None."""
+        if requested:
+            return Capture()
+        rate = self.rate()
+        if rate > 0 and random.random() < rate:
+            return Capture()
+        return None
+
+    def save(self, capture):
+        """Write `capture` into the ring, dropping the oldest profiles beyond `keep`; returns its id, or None.
+
+        A capture left empty, as by a call that timed out, is saved as a
+        `placeholder` of the time the request waited, so it still gets an id.
+        """
+        if capture is None:
+            return None
+        if capture.data is None:
+            capture.seconds = time.perf_counter() - capture.started
+            capture.data = placeholder(capture.seconds)
+        stamp = datetime.datetime.now(datetime.timezone.utc).strftime("%Y%m%dT%H%M%S.%f")
+        name = f"{stamp}-p{os.getpid()}-{round(capture.seconds * 1000)}ms.prof"
+        path = os.path.join(self.directory, name)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(path + ".tmp", "wb") as f:
+                f.write(capture.data)
+            os.replace(path + ".tmp", path)
+        except OSError as e:
+            print(f"Warning: Could not save a profile to {self.directory}: {e}")
+            return None
+        with self.lock:
+            for old in self.names()[self.keep:]:
+                try:
+                    os.remove(os.path.join(self.directory, old))
+                except FileNotFoundError:
+                    # Another worker pruned it first
+                    pass
+        return name
+
+    def names(self):
+        """Profile ids, newest first."""
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        return sorted((name for name in names if PROFILE_NAME.match(name)), reverse=True)
+
+    def entries(self):
+        profiles = []
+        for name in self.names():
+            stamp, pid, milliseconds = PROFILE_NAME.match(name).groups()
+            try:
+                size = os.path.getsize(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                continue
+            created = datetime.datetime.strptime(stamp, "%Y%m%dT%H%M%S.%f").replace(tzinfo=datetime.timezone.utc)
+            profiles.append({
+                "id": name,
+                "created": created.isoformat(),
+                "pid": int(pid),
+                "milliseconds": int(milliseconds),
+                "bytes": size,
+            })
+        return profiles
+
+    def path(self, name):
+        """Path of the profile `name`, or None if there is no such profile."""
+        if not PROFILE_NAME.match(name):
+            return None
+        path = os.path.join(self.directory, name)
+        return path if os.path.exists(path) else None
+
+    def text(self, name, limit=60):
+        """The `limit` functions of profile `name` with the most cumulative time, as pstats prints them."""
+        path = self.path(name)
+        if path is None:
+            return None
+        out = io.StringIO()
+        pstats.Stats(path, stream=out).strip_dirs().sort_stats("cumulative").print_stats(limit)
+        return out.getvalue()
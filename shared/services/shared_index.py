@@ -0,0 +1,47 @@
+import contextlib
+import fcntl
+import os
+from .artifact import Artifact
+
+
+def is_current(path, source_path):
+    if not os.path.exists(path):
+        return False
+    try:
+        return not Artifact(path).is_stale(source_path)
+    except ValueError:
+        return False
+
+
+def file_version(path):
+    """Identity of the file now at `path` (None if missing); changes whenever it is replaced."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+
+@contextlib.contextmanager
+def locked(path):
+    """Exclusive lock, across processes, on `path` + ".lock"."""
+    with open(path + ".lock", "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        yield
+
+
+def attach(directory, name, source_path, compile_index):
+    """Path of the shared copy of the job index, compiling it there first if needed.
+
+    `directory` is a tmpfs such as /dev/shm, so the file is POSIX shared memory:
+    every worker mmaps the same pages read-only. Whoever finds the copy missing or
+    stale takes the lock and calls `compile_index(path)`; the others wait and then
+    attach to what it wrote.
+    """
+    path = os.path.join(directory, name)
+    if is_current(path, source_path):
+        return path
+    with locked(path):
+        if not is_current(path, source_path):
+            compile_index(path)
+    return path
@@ -0,0 +1,97 @@
+import os
+from starlette.exceptions import HTTPException
+from starlette.responses import JSONResponse
+
+# Bytes read to tell a file's type from its content
+SNIFF_BYTES = 4096
+# Room in a request body for the form around the files, on top of their own limits
+FORM_OVERHEAD = 64 * 1024
+# First bytes of a DOCX, and of any other zip
+ZIP_SIGNATURES = (b"PK\x03\x04", b"PK\x05\x06")
+
+
+def sniff(head, ext):
+    """Whether `head`, the first bytes of a file, can start a file of type `ext`.
+
+    A PDF has its header in the first 1024 bytes, a DOCX (or zip) starts as a
+    zip archive and a text file has no NUL bytes. Other types are not checked.
+    """
+    if ext == "pdf":
+        return b"%PDF-" in head[:1024]
+    if ext in ("docx", "zip"):
+        return head.startswith(ZIP_SIGNATURES)
+    if ext == "txt":
+        return b"\0" not in head
+    return True
+
+
+def file_size(fileobj):
+    position = fileobj.tell()
+    fileobj.seek(0, os.SEEK_END)
+    size = fileobj.tell()
+    fileobj.seek(position)
+    return size
+
+
+def too_large(limit):
+    return f"Uploads here can be at most {limit / 2**20:.1f} MB."
+
+
+def check_file(file, limit, accepts, kind):
+    """(status, detail) if `file` is over `limit` bytes (0 is none) or `accepts` refuses its first bytes, else None."""
+    size = file_size(file.file)
+    if limit and size > limit:
+        return 413, f"{file.filename} is {size / 2**20:.1f} MB; {kind} files can be at most {limit / 2**20:.1f} MB."
+    position = file.file.tell()
+    head = file.file.read(SNIFF_BYTES)
+    file.file.seek(position)
+    if not accepts(head):
+        return 415, f"{file.filename} is not a valid {kind} file."
+    return None
+
+
+def check_upload(file, limits):
+    """`check_file` of `file` against the limit in `limits` for its type (0 is none) and against `sniff` for that type."""
+    ext = file.filename.split('.')[-1].lower()
+    return check_file(file, limits.get(ext), lambda head: sniff(head, ext), ext.upper())
+
+
+def body_limit(*limits):
+    """Limit for a request body carrying files with these limits: a little over the largest, or 0 (none) if any is 0."""
+    return max(limits) + FORM_OVERHEAD if all(limits) else 0
+
+
+class BodyLimit:
+    """ASGI middleware answering 413 to request bodies over `limits[path]` bytes.
+
+    A Content-Length over the limit is refused before any of the body is read.
+    Otherwise the body is counted as it arrives and reading stops once it passes
+    the limit, so however large an upload is, it takes at most that much memory
+    or spool file. Paths not in `limits` are left alone.
+    """
+
+    def __init__(self, app, limits):
+        self.app = app
+        self.limits = limits
+
+    async def __call__(self, scope, receive, send):
+        limit = self.limits.get(scope["path"]) if scope["type"] == "http" else None
+        if not limit:
+            await self.app(scope, receive, send)
+            return
+        length = dict(scope["headers"]).get(b"content-length", b"")
+        if length.isdigit() and int(length) > limit:
+            await JSONResponse(status_code=413, content={"detail": too_large(limit)})(scope, receive, send)
+            return
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            received += len(message.get("body", b""))
+            if received > limit:
+                # Raised inside the app, so it is answered like any route's HTTPException
+                raise HTTPException(status_code=413, detail=too_large(limit))
+            return message
+
+        await self.app(scope, limited_receive, send)
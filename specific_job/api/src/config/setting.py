@@ -8,3 +8,24 @@ class Settings(BaseSettings):
     DOMAIN: str = "0.0.0.0"
     BACKEND_PORT: int = 8080
     DEBUG_MODE: bool = True
+    INDEX_PATH: str = "static/job_index.bin"
+    SHARED_INDEX: bool = False
+    SHARED_INDEX_DIR: str = "/dev/shm"
+    SHARED_INDEX_NAME: str = "specific_job_index"
+    ADMIN_TOKEN: str = ""
+    CV_CACHE_SIZE: int = 256
+    CV_CACHE_DIR: str = ""
+    CV_CACHE_DISK_BYTES: int = 268435456
+    MIN_TITLE_SIMILARITY: float = 0.4
+    WORKER_PROCESSES: int = 2
+    TASK_TIMEOUT: float = 60
+    METRICS_DIR: str = ""
+    PROFILE_DIR: str = "/tmp/specific_job_profiles"
+    PROFILE_KEEP: int = 50
+    PROFILE_SAMPLE_RATE: float = 0
+    PDF_MAX_PAGES: int = 50
+    PDF_MAX_BYTES: int = 20971520
+    DOCX_MAX_BYTES: int = 10485760
+    TXT_MAX_BYTES: int = 1048576
+    PDF_TIME_BUDGET: float = 10
+    PDF_PROCESSES: int = 0
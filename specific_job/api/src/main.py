@@ -1,10 +1,26 @@
-from fastapi import FastAPI, HTTPException
+import asyncio
+import contextlib
+from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
 from routes.user import router
+from routes.admin import router as admin_router
+from routes.user import is_ready, warm_up
 import uvicorn
 from config import settings
+from services import metrics
+from services.upload_limits import BodyLimit, body_limit
 
-app = FastAPI()
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    # Off the event loop, so the app answers (and reports not ready) while it warms up
+    asyncio.get_running_loop().run_in_executor(None, warm_up)
+    yield
+
+app = FastAPI(lifespan=lifespan)
+
+# Refuse oversized uploads before they are read, or as soon as they pass the limit; added first so CORS headers wrap its 413s
+app.add_middleware(BodyLimit, limits={"/cv/inference": body_limit(settings.PDF_MAX_BYTES, settings.DOCX_MAX_BYTES, settings.TXT_MAX_BYTES)})
 
 # Enable CORS
 app.add_middleware(
@@ -17,14 +33,33 @@ app.add_middleware(
 
 # Include the routes from src/routes/user.py
 app.include_router(router)
+app.include_router(admin_router)
 
 @app.get("/")
 def root():
     return {"message": "Click /docs to see the API documentation"}
 
+@app.get("/health/live", include_in_schema=False)
+def live():
+    return {"status": "alive"}
+
+@app.get("/health/ready", include_in_schema=False)
+def ready():
+    if not is_ready():
+        return JSONResponse(status_code=503, content={"status": "warming up"})
+    return {"status": "ready"}
+
+@app.get("/metrics", include_in_schema=False)
+def get_metrics():
+    return PlainTextResponse(metrics.exposition(), media_type=metrics.CONTENT_TYPE)
+
 @app.exception_handler(404)
 def not_found_error(request, exc):
-    return {"detail": "Page Not Found. Click /docs to see the API documentation"}
+    # Keep the detail a route gave, such as a missing profile's
+    detail = getattr(exc, "detail", None)
+    if not detail or detail == "Not Found":
+        detail = "Page Not Found. Click /docs to see the API documentation"
+    return JSONResponse(status_code=404, content={"detail": detail})
 
 @app.exception_handler(Exception)
 def handle_exception(request, exc):
@@ -0,0 +1,12 @@
+import hmac
+from fastapi import Header, HTTPException
+from config import settings
+
+
+def is_admin(token):
+    return bool(settings.ADMIN_TOKEN and token and hmac.compare_digest(token, settings.ADMIN_TOKEN))
+
+
+def require_admin(x_admin_token: str = Header(None)):
+    if not is_admin(x_admin_token):
+        raise HTTPException(status_code=403, detail="A valid X-Admin-Token header is required.")
@@ -1,27 +1,108 @@
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException
-from services.main import JobMatcher
+import asyncio
+import tempfile
+import threading
+from fastapi import APIRouter, UploadFile, File, Form, Header, HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from services.main import JobMatcher, ERRORS, SERIALIZATION
+from services import metrics
+from services.cv_cache import CVCache
+from services.pool import WorkerPool
+from services.profiling import Profiler
+from services.upload_limits import check_upload
+from config import settings
+from .auth import is_admin
 
 router = APIRouter(
     prefix="/cv",
     tags=["CV Matching"]
 )
 
-job_matcher = JobMatcher()
+# Metrics are kept in files, so those of the worker processes (started below) count too, and
+# server workers sharing METRICS_DIR report each other's
+metrics.use_directory(settings.METRICS_DIR or tempfile.mkdtemp(prefix="specific_job_metrics-"))
+
+cv_cache = CVCache(settings.CV_CACHE_SIZE, settings.CV_CACHE_DIR or None, settings.CV_CACHE_DISK_BYTES)
+profiler = Profiler(settings.PROFILE_DIR, settings.PROFILE_KEEP, settings.PROFILE_SAMPLE_RATE)
+
+upload_limits = {"pdf": settings.PDF_MAX_BYTES, "docx": settings.DOCX_MAX_BYTES, "txt": settings.TXT_MAX_BYTES}
+
+# With a worker pool the CVs are read in its workers, which cannot start processes to spread pages over
+pdf_options = {
+    "pdf_max_pages": settings.PDF_MAX_PAGES, "pdf_max_bytes": settings.PDF_MAX_BYTES,
+    "pdf_budget": settings.PDF_TIME_BUDGET, "pdf_processes": 0 if settings.WORKER_PROCESSES else settings.PDF_PROCESSES,
+}
+
+if settings.SHARED_INDEX:
+    job_matcher = JobMatcher.shared(
+        settings.SHARED_INDEX_DIR, settings.SHARED_INDEX_NAME,
+        index_path=settings.INDEX_PATH, min_similarity=settings.MIN_TITLE_SIMILARITY, cache=cv_cache, **pdf_options,
+    )
+else:
+    job_matcher = JobMatcher(index_path=settings.INDEX_PATH, min_similarity=settings.MIN_TITLE_SIMILARITY, cache=cv_cache, **pdf_options)
+
+worker_pool = None
+if settings.WORKER_PROCESSES:
+    worker_pool = WorkerPool(settings.WORKER_PROCESSES, JobMatcher.worker, (job_matcher.worker_args(),))
+    worker_pool.start()
+
+warmed = threading.Event()
+
+def warm_up():
+    # With a pool the CVs are matched in its workers, which warm up as they start
+    if worker_pool is None:
+        try:
+            job_matcher.warm_up()
+        except Exception as e:
+            print(f"Warning: Warm-up failed: {e}")
+            return
+    warmed.set()
+
+def is_ready():
+    """Whether the jobs are loaded and warm here or in every pool worker."""
+    return warmed.is_set() and (worker_pool is None or worker_pool.ready())
 
 @router.post("/inference")
 async def match_cv(
     file: UploadFile = File(...),
     job_title: str = Form(...),
     governorate: str = Form(...),
-    level: str = Form(...)
+    level: str = Form(...),
+    x_profile: bool = Header(False),
+    x_admin_token: str = Header(None),
 ):
     if not file.filename.endswith((".pdf", ".docx", ".txt")):
+        ERRORS.inc("unsupported_file")
         raise HTTPException(status_code=400, detail="Only PDF, DOCX, and TXT files are supported.")
+    problem = check_upload(file, upload_limits)
+    if problem:
+        ERRORS.inc("unsupported_file")
+        status, detail = problem
+        raise HTTPException(status_code=status, detail=detail)
+    if x_profile and not is_admin(x_admin_token):
+        raise HTTPException(status_code=403, detail="Profiling a request needs a valid X-Admin-Token header.")
 
+    profile = profiler.capture(x_profile)
+    headers = {}
     try:
-        result = job_matcher.match_job(file, job_title, governorate, level)
+        try:
+            result = await job_matcher.match_upload(file, job_title, governorate, level, worker_pool, settings.TASK_TIMEOUT or None, profile=profile)
+        finally:
+            # Failed and timed-out requests, often the ones worth profiling, get their id too
+            if profile is not None:
+                profile_id = await asyncio.get_running_loop().run_in_executor(None, profiler.save, profile)
+                if profile_id:
+                    headers["X-Profile-Id"] = profile_id
         if "error" in result:
-            raise HTTPException(status_code=400, detail=result["error"])
-        return result
+            ERRORS.inc("rejected")
+            raise HTTPException(status_code=400, detail=result["error"], headers=headers)
+        with SERIALIZATION.time():
+            return JSONResponse(jsonable_encoder(result), headers=headers)
+    except asyncio.TimeoutError:
+        ERRORS.inc("timeout")
+        raise HTTPException(status_code=504, detail="Timed out processing the CV.", headers=headers)
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        ERRORS.inc("internal")
+        raise HTTPException(status_code=500, detail=str(e), headers=headers)
\ No newline at end of file
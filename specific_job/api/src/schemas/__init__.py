@@ -1,2 +1,4 @@
 from .user import UserOut, UserIn
 from .error import ExceptionHandler
+from .job import JobIn, JobKey, JobChanges
+from .profiling import ProfilingChange
@@ -1 +1,8 @@
+import os
+
+# Modules both services use are kept once, in shared/services at the root of the repository,
+# and imported from there as part of this package; the Docker images copy them in here instead
+SHARED = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "..", "..", "shared", "services"))
+__path__.append(SHARED)
+
 from .main import *
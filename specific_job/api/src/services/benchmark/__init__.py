@@ -0,0 +1,4 @@
+import os
+from .. import SHARED
+
+__path__.append(os.path.join(SHARED, "benchmark"))
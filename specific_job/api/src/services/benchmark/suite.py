@@ -0,0 +1,103 @@
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import numpy as np
+from ..main import JobMatcher
+from ..cv_cache import CVCache
+from ..pool import Upload
+from . import stats, synthetic
+
+# Every so many queries has a typo in the title, so the fuzzy fallback is timed too
+TYPO_EVERY = 5
+
+
+def job_queries(catalog, count, seed=0):
+    """(title, governorate, level, exact) for `count` random live jobs, some titles misspelled."""
+    rng = np.random.default_rng(seed)
+    queries = []
+    for i, row in enumerate(rng.choice(np.flatnonzero(catalog.live), count).tolist()):
+        job = catalog.job(row)
+        title = job["title"].strip()
+        exact = i % TYPO_EVERY or len(title) < 4
+        if not exact:
+            # Swap two neighbouring letters
+            at = int(rng.integers(1, len(title) - 2))
+            title = title[:at] + title[at + 1] + title[at] + title[at + 2:]
+        queries.append((title, job["governorate"], job["level"], bool(exact)))
+    return queries
+
+
+def run_scale(scale, path, cvs, repeat, min_similarity, seed):
+    """Timings of every stage of matching `cvs` to jobs from `path`."""
+    # No cache, so every repeat reads and extracts the CV again
+    matcher, load = stats.measured(JobMatcher, data_path=path, min_similarity=min_similarity, cache=CVCache(0))
+    snapshot = matcher.snapshot
+    queries = job_queries(matcher.catalog, len(cvs), seed)
+    stages = stats.Stages()
+    for i in range(repeat + 1):
+        if i == 1:
+            # The first pass warms up imports and the lazily built fuzzy title index
+            stages = stats.Stages()
+        for (name, content), (title, governorate, level, exact) in zip(cvs, queries):
+            fmt = name.rsplit(".", 1)[-1]
+            text, error = stages.run("read." + fmt, matcher.extract_text_from_cv, Upload(name, content))
+            if error:
+                raise RuntimeError(f"{name}: {error}")
+            skill_ids = stages.run("extract_skills", matcher.skill_ids, text, snapshot)
+            user_skills = [snapshot.extractor.skills[skill] for skill in skill_ids]
+            query = (title.lower(), governorate.lower(), level.lower())
+            stages.run("match" if exact else "match.fuzzy", matcher.match, snapshot, user_skills, *query)
+            stages.run("match_job", matcher.match_job, Upload(name, content), title, governorate, level)
+    return {
+        "scale": scale,
+        "jobs": matcher.catalog.live_count(),
+        "skills": len(matcher.catalog.skills),
+        "titles": len(snapshot.job_resolver().titles.names),
+        "load": load,
+        "stages": stages.report(),
+        "peak_rss_bytes": stats.peak_rss(),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark reading, skill extraction and job matching of CVs against synthetic job catalogues.")
+    parser.add_argument("--data", default=os.path.join("static", "job_data.csv"), help="catalogue the synthetic ones imitate")
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 10, 100], help="catalogue sizes, in multiples of --data")
+    parser.add_argument("--cvs", type=int, default=24, help="synthetic CVs, spread over formats and lengths")
+    parser.add_argument("--repeat", type=int, default=3, help="timed passes over the CVs, after one warm-up pass")
+    parser.add_argument("--min-similarity", type=float, default=0.4, help="fuzzy title match threshold")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workdir", help="keep the synthetic catalogues here and reuse them on the next run")
+    parser.add_argument("--output", help="JSON report file (default: stdout)")
+    parser.add_argument("--baseline", help="earlier JSON report to compare the medians with")
+    args = parser.parse_args(argv)
+
+    catalog = synthetic.source_catalog(args.data)
+    cvs = synthetic.synthetic_cvs(catalog, args.cvs, seed=args.seed)
+    workdir = args.workdir or tempfile.mkdtemp(prefix="specific-job-bench-")
+    os.makedirs(workdir, exist_ok=True)
+    report = {
+        "service": "specific_job",
+        "environment": stats.environment(),
+        "settings": {"cvs": args.cvs, "repeat": args.repeat, "min_similarity": args.min_similarity, "seed": args.seed},
+        "scales": [],
+    }
+    try:
+        for scale in args.scales:
+            path = os.path.join(workdir, f"jobs_{scale}x_seed{args.seed}.csv")
+            if not os.path.exists(path):
+                synthetic.write_jobs(catalog, scale, path, args.seed)
+            print(f"Scale {scale}x...", file=sys.stderr)
+            report["scales"].append(stats.isolated(run_scale, scale, path, cvs, args.repeat, args.min_similarity, args.seed))
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    stats.write_report(report, args.output)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        print("\n".join(stats.compare(baseline, report)), file=sys.stderr)
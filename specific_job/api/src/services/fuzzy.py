@@ -0,0 +1,140 @@
+import math
+import re
+import numpy as np
+
+# Spellings users type -> the wording the catalog uses, matched on whole words
+TITLE_ALIASES = {
+    "dotnet": ".net", "asp.net": ".net", "js": "javascript", "nodejs": "node.js",
+    "reactjs": "react", "react.js": "react", "angularjs": "angular", "front end": "frontend",
+    "front-end": "frontend", "back end": "backend", "back-end": "backend", "fullstack": "full stack",
+    "full-stack": "full stack", "dev": "developer", "eng": "engineer", "engr": "engineer",
+    "postgres": "postgresql", "gcp": "google cloud", "ai/ml": "machine learning",
+}
+GOVERNORATE_ALIASES = {
+    "alex": "alexandria", "6th of october": "giza", "october": "giza", "mansoura": "dakahlia",
+    "zagazig": "sharqia", "tanta": "gharbia", "hurghada": "red sea", "sharm el sheikh": "south sinai",
+    "mecca": "makkah", "jedda": "jeddah", "qalyubia": "qalubia", "menofia": "monufya", "monufia": "monufya",
+}
+LEVEL_ALIASES = {
+    "entry": "fresh", "entry level": "fresh", "graduate": "fresh", "fresher": "fresh", "intern": "fresh",
+    "jr": "junior", "sr": "senior", "intermediate": "mid", "mid level": "mid", "mid-level": "mid",
+    "middle": "mid", "lead": "manager", "head": "manager", "mgr": "manager",
+}
+
+# How much better than the runner-up a name must score to be picked on its own
+MIN_MARGIN = 0.1
+
+
+def alias_pattern(aliases):
+    keys = sorted(aliases, key=len, reverse=True)
+    # "." counts as part of a word so "js" in "node.js" is left alone
+    return re.compile(r"(?<![\w.])(" + "|".join(re.escape(key) for key in keys) + r")(?![\w.])")
+
+
+def normalize(text, aliases=None, pattern=None):
+    text = " ".join(text.lower().split())
+    if aliases:
+        text = pattern.sub(lambda match: aliases[match.group(1)], text)
+    return text
+
+
+def trigrams(text):
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class TrigramIndex:
+    """Ranks a fixed list of names by trigram similarity to a query.
+
+    Each name's character trigrams go into an inverted index (CSR postings), so a
+    query only looks at names it shares a trigram with. Similarity is the Jaccard
+    index of the two trigram sets.
+    """
+
+    def __init__(self, names, aliases=None):
+        self.names = list(names)
+        self.aliases = aliases
+        self.pattern = alias_pattern(aliases) if aliases else None
+        self.gram_ids = {}
+        postings = []
+        name_grams = []
+        for i, name in enumerate(self.names):
+            grams = [self.gram_ids.setdefault(gram, len(self.gram_ids)) for gram in trigrams(normalize(name, aliases, self.pattern))]
+            name_grams.append(grams)
+            postings.extend([] for _ in range(len(self.gram_ids) - len(postings)))
+            for gram_id in grams:
+                postings[gram_id].append(i)
+        self.postings_indptr = np.zeros(len(postings) + 1, dtype=np.int64)
+        self.postings_indptr[1:] = np.cumsum([len(ids) for ids in postings])
+        self.postings = np.fromiter((i for ids in postings for i in ids), dtype=np.int32, count=self.postings_indptr[-1])
+        # ... and the other way round: the trigram ids of every name
+        self.grams_indptr = np.zeros(len(name_grams) + 1, dtype=np.int64)
+        self.grams_indptr[1:] = np.cumsum([len(grams) for grams in name_grams])
+        self.grams = np.fromiter((g for grams in name_grams for g in grams), dtype=np.int32, count=self.grams_indptr[-1])
+        self.sizes = np.diff(self.grams_indptr)
+        self.mean_size = self.sizes.mean() if len(self.names) else 0.0
+
+    def rank(self, query, limit=5, min_similarity=0.0):
+        """[(name, similarity), ...] for the `limit` closest names, best first.
+
+        A name scoring at least `min_similarity` shares at least that fraction of the
+        query's trigrams, so it is in the postings of one of the rarest
+        `len(grams) - ceil(min_similarity * len(grams)) + 1` of them. When those
+        postings are short, only their names are scored; otherwise the shared counts
+        come from one bincount over all the query's postings.
+        """
+        grams = trigrams(normalize(query, self.aliases, self.pattern))
+        gram_ids = np.asarray([self.gram_ids.get(gram, -1) for gram in grams], dtype=np.int64)
+        gram_ids = gram_ids[gram_ids >= 0]
+        if not gram_ids.size:
+            return []
+        starts, ends = self.postings_indptr[gram_ids], self.postings_indptr[gram_ids + 1]
+        lengths = ends - starts
+        # Query trigrams missing from the index are the rarest of all
+        prefix = len(gram_ids) - math.ceil(min_similarity * len(grams)) + 1
+        if prefix <= 0:
+            return []
+        rarest = np.argsort(lengths, kind="stable")[:prefix]
+        if lengths[rarest].sum() * self.mean_size < lengths.sum():
+            ids = np.unique(np.concatenate([self.postings[starts[i]:ends[i]] for i in rarest]))
+            sizes = self.sizes[ids]
+            firsts = np.cumsum(sizes) - sizes
+            positions = np.repeat(self.grams_indptr[ids] - firsts, sizes) + np.arange(sizes.sum())
+            shared = np.add.reduceat(np.isin(self.grams[positions], gram_ids), firsts)
+        else:
+            shared = np.bincount(
+                np.concatenate([self.postings[a:b] for a, b in zip(starts.tolist(), ends.tolist())]),
+                minlength=len(self.names),
+            )
+            ids = np.flatnonzero(shared)
+            shared = shared[ids]
+            sizes = self.sizes[ids]
+        scores = shared / (len(grams) + sizes - shared)
+        if len(ids) > limit:
+            best = np.argpartition(-scores, limit - 1)[:limit]
+            ids, scores = ids[best], scores[best]
+        order = np.lexsort((ids, -scores))
+        return [(self.names[ids[i]], float(scores[i])) for i in order]
+
+    def resolve(self, query, min_similarity, limit=5):
+        """The closest name, or None unless it scores `min_similarity` and clearly beats the
+        runner-up; plus the names scoring at least half that, as suggestions."""
+        ranked = self.rank(query, limit, min_similarity / 2)
+        best = None
+        if ranked and ranked[0][1] >= min_similarity:
+            if len(ranked) == 1 or ranked[0][1] - ranked[1][1] >= MIN_MARGIN:
+                best = ranked[0][0]
+        return best, [name for name, score in ranked if score >= min_similarity / 2]
+
+
+class JobResolver:
+    """Trigram indexes over the live titles, governorates and levels of a catalog."""
+
+    def __init__(self, catalog):
+        values = {}
+        for name in ("title", "governorate", "level"):
+            column = catalog.columns[name]
+            values[name] = sorted(set(column.values[code].strip().lower() for code in np.unique(column.codes[catalog.live]).tolist()))
+        self.titles = TrigramIndex(values["title"], TITLE_ALIASES)
+        self.governorates = TrigramIndex(values["governorate"], GOVERNORATE_ALIASES)
+        self.levels = TrigramIndex(values["level"], LEVEL_ALIASES)
@@ -1,34 +1,166 @@
+import asyncio
+import functools
+import importlib
 import os
-import re
-import pandas as pd
-import PyPDF2
-import docx
-import nltk
+import time
+import numpy as np
 from fastapi import UploadFile
-from io import BytesIO
-
-# Download NLTK data (punkt for tokenization)
-try:
-    nltk.download('punkt', quiet=True)
-except Exception as e:
-    print(f"Warning: Failed to download NLTK punkt: {e}")
+from .artifact import Artifact, source_stamp, source_version, write_artifact
+from .catalog import JobCatalog
+from .extractor import SkillExtractor
+from .fuzzy import JobResolver
+from .cv_cache import CVCache, upload_key
+from .pool import Upload
+from . import documents, metrics, profiling, shared_index
 
 # Constants
 STOPWORDS = set([
     "a", "the", "of", "and", "to", "up", "i", "com", "student", "education", "experience"
 ])
 
+# Resolve the path to job_data.csv relative to this file
+DATA_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'static', 'job_data.csv')
+# Imported on first use, or by `warm_up`, as they are slow to import and not needed to start
+PARSER_MODULES = ("PyPDF2",)
+WARM_UP_SKILLS = 20
+
+ERROR_TYPES = ("unsupported_file", "rejected", "timeout", "internal")
+UPLOAD_READ = metrics.histogram("cv_upload_read_seconds", "Reading and hashing an uploaded CV.")
+TEXT_EXTRACTION = metrics.histogram("cv_text_extraction_seconds", "Extracting the text of a CV, by file type.", "format", ("pdf", "docx", "txt"))
+SKILL_EXTRACTION = metrics.histogram("cv_skill_extraction_seconds", "Finding the known skills in a CV's text.")
+PDF_PAGES = metrics.histogram("cv_pdf_pages", "Pages read of a PDF CV.", buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500))
+PDF_TRUNCATED = metrics.counter("cv_pdf_truncated_total", "PDF CVs only partly read, by the limit they reached.", "limit", ("pages", "time"))
+MATCHING = metrics.histogram("job_match_seconds", "Finding the requested job and comparing its skills with a CV's.")
+SERIALIZATION = metrics.histogram("cv_response_serialization_seconds", "Rendering a result as JSON.")
+ERRORS = metrics.counter("cv_errors_total", "CVs that got an error, by cause.", "type", ERROR_TYPES)
+
+class Snapshot:
+    """One version of the jobs: everything a request reads, replaced as a whole."""
+
+    def __init__(self, catalog, extractor, version):
+        self.catalog = catalog
+        self.extractor = extractor
+        self.version = version
+        self.resolver = None
+
+    def job_resolver(self):
+        # Built on first use: most requests name a job exactly
+        if self.resolver is None:
+            self.resolver = JobResolver(self.catalog)
+        return self.resolver
+
+
 class JobMatcher:
-    def __init__(self):
-        # Resolve the path to job_data.csv relative to this file
-        base_dir = os.path.dirname(os.path.abspath(__file__))
-        self.data_path = '/home/yaz/specific_job/api/src/static/job_data.csv'
-        self.df, self.error = self.load_data()
+    def __init__(self, index_path=None, data_path=None, min_similarity=0.4, cache=None,
+                 pdf_max_pages=0, pdf_max_bytes=0, pdf_budget=0, pdf_processes=0):
+        self.data_path = data_path or DATA_PATH
+        self.cache = cache or CVCache()
+        self.min_similarity = min_similarity
+        self.pdf_max_pages = pdf_max_pages
+        self.pdf_max_bytes = pdf_max_bytes
+        self.pdf_budget = pdf_budget
+        self.pdf_pool = documents.PagePool(pdf_processes) if pdf_processes else None
+        self.index_path = index_path
+        self.error = None
+        self.version = shared_index.file_version(self.index_path or self.data_path)
+        self.snapshot = self.load()
+
+    @property
+    def catalog(self):
+        return self.snapshot.catalog
+
+    @property
+    def extractor(self):
+        return self.snapshot.extractor
+
+    @property
+    def all_skills(self):
+        return self.snapshot.catalog.skills
+
+    def load(self):
+        artifact = self.open_index()
+        if artifact is not None:
+            return Snapshot(JobCatalog.from_artifact(artifact), SkillExtractor.from_artifact(artifact), source_version(artifact.meta))
+        df, self.error = self.load_data()
         if self.error:
             raise ValueError(self.error)
-        self.all_skills = self.get_all_skills()
+        catalog = JobCatalog.from_frame(df)
+        return Snapshot(catalog, SkillExtractor(list(catalog.skills)), source_version(source_stamp(self.data_path)))
+
+    def refresh(self):
+        """Reload if another worker has since written a new version of the jobs."""
+        version = shared_index.file_version(self.index_path or self.data_path)
+        if version != self.version:
+            self.version = version
+            self.snapshot = self.load()
+
+    def apply_changes(self, upserts=(), deletes=()):
+        """Add or replace `upserts` and delete the jobs keyed by `deletes`.
+
+        The new catalog and extractor are derived from the current ones and swapped in
+        with a single assignment, so requests already running finish on the version
+        they started with. The CSV and index file are rewritten under a lock shared by
+        all workers, which pick the change up through `refresh`.
+        """
+        with shared_index.locked(self.data_path):
+            self.refresh()
+            snapshot = self.snapshot
+            catalog, changes = snapshot.catalog.updated(upserts, deletes)
+            unused = np.flatnonzero(catalog.skill_counts() == 0).tolist()
+            extractor = snapshot.extractor.updated(catalog.skills, unused)
+            catalog.write_csv(self.data_path)
+            snapshot = Snapshot(catalog, extractor, source_version(source_stamp(self.data_path)))
+            if self.index_path:
+                self.save_snapshot(snapshot, self.index_path)
+            self.version = shared_index.file_version(self.index_path or self.data_path)
+            self.snapshot = snapshot
+        return {
+            "added": len(changes["inserted"]),
+            "updated": len(changes["updated"]),
+            "deleted": len(changes["deleted"]),
+            "not_found": [list(key) for key in changes["not_found"]],
+            "jobs": catalog.live_count(),
+        }
+
+    @classmethod
+    def shared(cls, directory, name, index_path=None, data_path=None, **kwargs):
+        """Matcher attached read-only to a copy of the index in shared memory.
+
+        The first worker to start compiles it (from `index_path` when that is current,
+        else from the CSV); the rest attach to the same pages.
+        """
+        data_path = data_path or DATA_PATH
+        path = shared_index.attach(
+            directory, name, data_path,
+            lambda path: cls(index_path=index_path, data_path=data_path).save_index(path),
+        )
+        return cls(index_path=path, data_path=data_path, **kwargs)
+
+    def open_index(self):
+        if not self.index_path or not os.path.exists(self.index_path):
+            return None
+        try:
+            artifact = Artifact(self.index_path)
+        except ValueError as e:
+            print(f"Warning: Ignoring job index: {e}")
+            return None
+        if "catalog.skills" not in artifact or "extractor.keys" not in artifact:
+            print(f"Warning: {self.index_path} has no job catalog, loading {self.data_path} instead")
+            return None
+        if artifact.is_stale(self.data_path):
+            print(f"Warning: {self.index_path} was compiled from a different {self.data_path}, loading the CSV instead")
+            return None
+        return artifact
+
+    def save_index(self, path):
+        self.save_snapshot(self.snapshot, path)
+
+    def save_snapshot(self, snapshot, path):
+        arrays = {**snapshot.catalog.to_arrays(), **snapshot.extractor.to_arrays()}
+        write_artifact(path, arrays, meta={**source_stamp(self.data_path), "jobs": snapshot.catalog.live_count()})
 
     def load_data(self):
+        import pandas as pd
         try:
             if not os.path.exists(self.data_path):
                 return pd.DataFrame(), f"File not found: {self.data_path}"
@@ -44,33 +176,77 @@ class JobMatcher:
         except Exception as e:
             return pd.DataFrame(), f"Error loading data: {e}"
 
+    def text_chunks(self, file: UploadFile):
+        """The upload's text in pieces, parsed as they are iterated over."""
+        ext = file.filename.split('.')[-1].lower()
+        if ext == 'pdf':
+            return documents.PdfText(file.file, self.pdf_max_pages, self.pdf_max_bytes, self.pdf_budget, self.pdf_pool)
+        elif ext == 'docx':
+            return documents.docx_chunks(file.file)
+        elif ext == 'txt':
+            return documents.txt_chunks(file.file)
+        raise ValueError(f"Unsupported file format: {ext}")
+
     def extract_text_from_cv(self, file: UploadFile):
-        text = ""
         ext = file.filename.split('.')[-1].lower()
         try:
-            file_content = file.file.read()  # Read file content into memory
-            if ext == 'pdf':
-                reader = PyPDF2.PdfReader(BytesIO(file_content))
-                for page in reader.pages:
-                    text += page.extract_text() or ""
-            elif ext == 'docx':
-                doc = docx.Document(BytesIO(file_content))
-                text = "\n".join([para.text for para in doc.paragraphs])
-            elif ext == 'txt':
-                text = file_content.decode('utf-8')
-            else:
-                return None, f"Unsupported file format: {ext}"
-            return text, None
+            with TEXT_EXTRACTION.time(ext):
+                return "".join(self.text_chunks(file)), None
         except Exception as e:
             return None, str(e)
 
-    def extract_skills(self, text, skills_list):
+    def lookup(self, file: UploadFile):
+        """(cache key, cached entry or None) for an upload."""
+        with UPLOAD_READ.time():
+            key = upload_key(file.file, file.filename.split('.')[-1])
+        return key, self.cache.get(key)
+
+    def read_cv(self, file: UploadFile, snapshot, cached=None):
+        """(entry, error): the upload's text and its skill ids under `snapshot`, reusing `cached`."""
+        entry = cached
+        if entry is None:
+            return self.read_new(file, snapshot)
+        if entry.get("version") != snapshot.version:
+            entry = dict(entry, version=snapshot.version, skill_ids=self.skill_ids(entry["text"], snapshot))
+        return entry, None
+
+    def read_new(self, file: UploadFile, snapshot):
+        """`read_cv` for an upload not in the cache, finding its skills as its text is parsed."""
+        ext = file.filename.split('.')[-1].lower()
+        reader = documents.TextReader(functools.partial(self.text_chunks, file))
+        start = time.perf_counter()
+        try:
+            skill_ids = self.kept(snapshot.extractor.find_chunks(reader), snapshot)
+        except Exception as e:
+            return None, str(e)
+        finally:
+            TEXT_EXTRACTION.observe(reader.seconds, ext)
+        SKILL_EXTRACTION.observe(time.perf_counter() - start - reader.seconds)
+        document = {"format": ext, **reader.stats()}
+        if ext == 'pdf':
+            PDF_PAGES.observe(document["pages"])
+            if document["truncated"]:
+                PDF_TRUNCATED.inc(document["truncated"])
+        return {"text": reader.text(), "version": snapshot.version, "skill_ids": skill_ids, "document": document}, None
+
+    def remember(self, key, cached, entry):
+        if entry is not None and (cached is None or cached.get("version") != entry["version"]):
+            self.cache.put(key, entry)
+
+    def skill_ids(self, text, snapshot):
         if not text:
             return []
-        text = text.lower()
-        found = [s for s in skills_list if re.search(r'\b' + re.escape(s.lower()) + r'\b', text)]
-        filtered = [s for s in found if s.lower() not in STOPWORDS and len(s) > 2]
-        return list(set(filtered))
+        with SKILL_EXTRACTION.time():
+            return self.kept(snapshot.extractor.find(text), snapshot)
+
+    def kept(self, skill_ids, snapshot):
+        """The found `skill_ids` worth matching on: no stopwords or very short skills."""
+        skills = snapshot.extractor.skills
+        return [i for i in skill_ids if skills[i].lower() not in STOPWORDS and len(skills[i]) > 2]
+
+    def extract_skills(self, text, snapshot=None):
+        snapshot = snapshot or self.snapshot
+        return [snapshot.extractor.skills[i] for i in self.skill_ids(text, snapshot)]
 
     def analyze_skills(self, user_skills, job_skills):
         user_lower = set(s.lower() for s in user_skills)
@@ -79,51 +255,103 @@ class JobMatcher:
         return matched, missing
 
     def get_all_skills(self):
-        all_skills = []
-        for skill_text in self.df['skills']:
-            skills = [s.strip() for s in str(skill_text).split(',')]
-            all_skills.extend(skills)
-        return list(set(all_skills))
+        return list(self.catalog.skills)
+
+    def worker_args(self):
+        """Keyword arguments for a matcher in a worker process reading the same jobs.
+
+        Pool workers cannot start processes of their own, so they read a PDF's pages one after another.
+        """
+        return {
+            "index_path": self.index_path, "data_path": self.data_path, "min_similarity": self.min_similarity,
+            "pdf_max_pages": self.pdf_max_pages, "pdf_max_bytes": self.pdf_max_bytes, "pdf_budget": self.pdf_budget,
+        }
+
+    @classmethod
+    def worker(cls, kwargs):
+        # Workers are handed cached entries, so they keep no cache of their own
+        matcher = cls(cache=CVCache(0), **kwargs)
+        matcher.warm_up()
+        return matcher
+
+    def warm_up(self):
+        """Import the CV parsers, build the fuzzy job index and look for some skills, so the first request pays for none of it."""
+        for name in PARSER_MODULES:
+            importlib.import_module(name)
+        if self.pdf_pool is not None:
+            self.pdf_pool.warm_up()
+        snapshot = self.snapshot
+        snapshot.job_resolver()
+        skills = [snapshot.catalog.skills[i] for i in range(min(WARM_UP_SKILLS, len(snapshot.catalog.skills)))]
+        snapshot.extractor.find(" ".join(skills))
 
     def match_job(self, file: UploadFile, job_title: str, governorate: str, level: str):
+        key, cached = self.lookup(file)
+        result, entry = self.analyze(file, cached, job_title, governorate, level)
+        self.remember(key, cached, entry)
+        return result
+
+    async def match_upload(self, file: UploadFile, job_title: str, governorate: str, level: str, pool=None, timeout=None, profile=None):
+        """`match_job` off the event loop: in a worker of `pool` if given, else in a thread.
+
+        Raises asyncio.TimeoutError after `timeout` seconds, killing the pool worker.
+        With a `profiling.Capture` as `profile`, the reading and matching are profiled into it.
+        """
+        loop = asyncio.get_running_loop()
+        key, cached = await loop.run_in_executor(None, self.lookup, file)
+        if pool is None:
+            analyze = profiling.wrap(self.analyze, profile)
+            task = asyncio.wait_for(loop.run_in_executor(None, analyze, file, cached, job_title, governorate, level), timeout)
+        else:
+            content = None if cached else await loop.run_in_executor(None, file.file.read)
+            task = pool.run(profiling.wrap(analyze_upload, profile), file.filename, content, cached, job_title, governorate, level, timeout=timeout)
+        result, entry = await profiling.collect(task, profile)
+        self.remember(key, cached, entry)
+        return result
+
+    def analyze(self, file: UploadFile, cached, job_title: str, governorate: str, level: str):
+        """(result, cache entry) for an upload, given what the cache had for it."""
         # Validate inputs
         job_title = job_title.strip().lower()
         governorate = governorate.strip().lower()
         level = level.strip().lower()
         if not all([job_title, governorate, level]):
-            return {"error": "Job title, governorate, and level must not be empty."}
+            return {"error": "Job title, governorate, and level must not be empty."}, None
 
-        # Extract text from CV
-        text, error = self.extract_text_from_cv(file)
+        # Extract text and skills from CV
+        self.refresh()
+        snapshot = self.snapshot
+        entry, error = self.read_cv(file, snapshot, cached)
         if error:
-            return {"error": error}
-
-        # Extract user skills
-        user_skills = self.extract_skills(text, self.all_skills)
+            return {"error": error}, None
+        user_skills = [snapshot.extractor.skills[i] for i in entry["skill_ids"]]
         if not user_skills:
-            return {"error": "No valid skills found in CV."}
-
-        # Normalize DataFrame for matching
-        level_col = 'professional level' if 'professional level' in df.columns else 'professional Level'
-        df = self.df
-        df['job_title_lower'] = df['Job Title'].str.strip().str.lower()
-        df['governorate_lower'] = df['Governorate'].str.strip().str.lower()
-        df['level_lower'] = df[level_col].str.strip().str.lower()
-
-        # Find matching job
-        job_row = df[
-            (df['job_title_lower'] == job_title) &
-            (df['governorate_lower'] == governorate) &
-            (df['level_lower'] == level)
-        ]
-
-        if job_row.empty:
-            job_row = df[df['job_title_lower'] == job_title]
-            if job_row.empty:
-                return {"error": f"No matching job found for title '{job_title}'."}
+            return {"error": "No valid skills found in CV."}, entry
+        with MATCHING.time():
+            result = self.match(snapshot, user_skills, job_title, governorate, level)
+        if "error" not in result:
+            result["document"] = entry.get("document")
+        return result, entry
+
+    def match(self, snapshot, user_skills, job_title, governorate, level):
+        # Find matching job, falling back to the closest known title, governorate and level
+        catalog = snapshot.catalog
+        row = catalog.find(job_title, governorate, level)
+        if row is None:
+            resolver = snapshot.job_resolver()
+            title, suggestions = resolver.titles.resolve(job_title, self.min_similarity)
+            if title is None:
+                hint = f" Did you mean: {', '.join(suggestions)}?" if suggestions else ""
+                return {"error": f"No matching job found for title '{job_title}'.{hint}"}
+            job_title = title
+            governorate = resolver.governorates.resolve(governorate, self.min_similarity)[0] or governorate
+            level = resolver.levels.resolve(level, self.min_similarity)[0] or level
+            row = catalog.find(job_title, governorate, level)
+            if row is None:
+                row = catalog.find(job_title)
 
         # Extract job skills
-        job_skills = [s.strip() for s in job_row.iloc[0]['skills'].split(',')]
+        job_skills = catalog.skills_of(row)
         matched, missing = self.analyze_skills(user_skills, job_skills)
         percent = round((len(matched) / len(job_skills)) * 100, 2) if job_skills else 0
         top_missing = missing[:5] if len(missing) > 5 else missing
@@ -141,4 +369,12 @@ class JobMatcher:
             },
             "top_missing_suggestions": top_missing,
             "recommendation": f"To improve your chances, consider learning or highlighting these skills in your CV: {', '.join(top_missing)}."
-        }
\ No newline at end of file
+        }
+
+def analyze_upload(matcher, filename, content, cached, job_title, governorate, level):
+    """`JobMatcher.analyze` as a `WorkerPool` call."""
+    return matcher.analyze(Upload(filename, content), cached, job_title, governorate, level)
+
+
+# The matcher the shared tools, such as compile_index, build this service's index with
+Matcher = JobMatcher
@@ -0,0 +1,73 @@
+import os
+import subprocess
+import sys
+import textwrap
+
+import pytest
+
+from shared.services import metrics
+
+
+def sample(name, **labels):
+    from prometheus_client import REGISTRY
+    return REGISTRY.get_sample_value(name, labels)
+
+
+def test_only_declared_values_are_counted():
+    errors = metrics.counter("test_errors_total", "Errors.", "type", ("bad", "internal"))
+    errors.inc("bad")
+    errors.inc("bad", 2)
+    errors.inc("unknown")
+    assert sample("test_errors_total", type="bad") == 3
+    assert sample("test_errors_total", type="internal") == 0
+    assert sample("test_errors_total", type="unknown") is None
+
+
+def test_time_observes_blocks_that_raise():
+    seconds = metrics.histogram("test_stage_seconds", "Time.", "stage", ("read",))
+    with seconds.time("read"):
+        pass
+    with pytest.raises(ValueError), seconds.time("read"):
+        raise ValueError
+    with seconds.time("unknown"):
+        pass
+    assert sample("test_stage_seconds_count", stage="read") == 2
+    assert sample("test_stage_seconds_bucket", stage="read", le="0.001") == 2
+
+
+def test_directory_cannot_be_set_once_metrics_are_recorded(tmp_path):
+    metrics.counter("test_late_total", "Late.").inc()
+    with pytest.raises(RuntimeError):
+        metrics.use_directory(str(tmp_path))
+
+
+def test_processes_sharing_a_directory_report_each_others_metrics(tmp_path):
+    # prometheus_client only reads the directory when first imported, so each process is a fresh interpreter
+    script = textwrap.dedent("""
+        import multiprocessing, sys
+        from shared.services import metrics
+
+        SCORING = metrics.histogram("test_scoring_seconds", "Scoring.")
+        REQUESTS = metrics.counter("test_requests_total", "Requests.")
+
+        def work():
+            SCORING.observe(0.2)
+
+        if __name__ == "__main__":
+            metrics.use_directory(sys.argv[1])
+            REQUESTS.inc()
+            worker = multiprocessing.get_context("spawn").Process(target=work)
+            worker.start()
+            worker.join()
+            print(metrics.exposition())
+    """)
+    path = tmp_path / "app.py"
+    path.write_text(script)
+    env = dict(os.environ, PYTHONPATH=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    env.pop("PROMETHEUS_MULTIPROC_DIR", None)
+    run = lambda: subprocess.run([sys.executable, str(path), str(tmp_path / "metrics")], env=env, capture_output=True, text=True, check=True).stdout
+    run()
+    exposition = run()
+    assert "test_requests_total 2.0" in exposition
+    assert "test_scoring_seconds_count 2.0" in exposition
+    assert 'test_scoring_seconds_bucket{le="0.25"} 2.0' in exposition
@@ -0,0 +1,120 @@
+import asyncio
+import socket
+import time
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from loadtest.stubs import StubServer
+from upstreams import Upstreams
+
+
+@pytest.fixture
+def stubs():
+    server = StubServer(latency=dict.fromkeys(("llm", "tts", "audio", "avatar", "gemini"), 0)).start()
+    yield server
+    server.stop()
+
+
+def run(upstreams, *calls):
+    """Await `calls` (coroutine functions taking `upstreams`) together, then close the clients."""
+    async def main():
+        try:
+            return await asyncio.gather(*(call(upstreams) for call in calls))
+        finally:
+            await upstreams.aclose()
+    return asyncio.run(main())
+
+
+def tts(stubs, timeout=5, idempotent=True):
+    return lambda upstreams: upstreams.request("POST", f"{stubs.url}/tts", timeout, idempotent=idempotent, json={"text": "hi"})
+
+
+def closed_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def test_sequential_calls_reuse_one_connection(stubs):
+    async def calls(upstreams):
+        return [(await tts(stubs)(upstreams)).status_code for _ in range(5)]
+
+    assert run(Upstreams(), calls) == [[200] * 5]
+    assert stubs.calls["tts"] == 5
+    assert stubs.calls["connections"] == 1
+
+
+def test_concurrent_calls_stay_within_the_pool(stubs):
+    stubs.latency["tts"] = 0.2
+    responses = run(Upstreams(pool_size=2), *[tts(stubs)] * 6)
+    assert [r.status_code for r in responses] == [200] * 6
+    assert stubs.calls["connections"] == 2
+
+
+def test_hosts_get_their_own_clients(stubs):
+    upstreams = Upstreams()
+    other = stubs.url.replace("127.0.0.1", "localhost")
+    assert upstreams.client(f"{stubs.url}/tts") is upstreams.client(f"{stubs.url}/sync")
+    assert upstreams.client(f"{stubs.url}/tts") is not upstreams.client(f"{other}/tts")
+
+
+def test_503_is_retried_after_a_backoff(stubs):
+    stubs.failures = {"tts": 0.5}
+    start = time.monotonic()
+    [response] = run(Upstreams(retries=2, backoff=0.2), tts(stubs, idempotent=False))
+    assert response.status_code == 200
+    assert stubs.calls["tts"] == 2
+    assert stubs.calls["failures"] == 1
+    assert time.monotonic() - start >= 0.1
+
+
+def test_last_503_is_returned_once_retries_run_out(stubs):
+    stubs.failures = {"tts": 1}
+    [response] = run(Upstreams(retries=2, backoff=0.01), tts(stubs))
+    assert response.status_code == 503
+    assert stubs.calls["tts"] == 3
+
+
+def test_connection_errors_are_retried_with_growing_backoff():
+    url = f"http://127.0.0.1:{closed_port()}/tts"
+    start = time.monotonic()
+    with pytest.raises(httpx.ConnectError):
+        run(Upstreams(retries=2, backoff=0.1), lambda upstreams: upstreams.request("POST", url, 5))
+    # Waits of 0.05-0.15 and 0.1-0.3 seconds
+    assert 0.15 <= time.monotonic() - start < 2
+
+
+def test_timeout_is_per_call(stubs):
+    stubs.latency["tts"] = 1
+    start = time.monotonic()
+    with pytest.raises(httpx.ReadTimeout):
+        run(Upstreams(retries=2, backoff=0.01), tts(stubs, timeout=0.2, idempotent=False))
+    assert time.monotonic() - start < 0.8
+    # The upstream may have acted on a call that timed out, so it is not sent again
+    assert stubs.calls["tts"] == 1
+
+
+def test_idempotent_calls_are_retried_after_a_timeout(stubs):
+    stubs.latency["tts"] = 0.5
+    with pytest.raises(httpx.ReadTimeout):
+        run(Upstreams(retries=1, backoff=0.01), tts(stubs, timeout=0.1))
+    assert stubs.calls["tts"] == 2
+
+
+def test_lifespan_closes_the_clients(stubs):
+    upstreams = Upstreams()
+    app = FastAPI(lifespan=upstreams.lifespan)
+
+    @app.get("/")
+    async def call():
+        return (await upstreams.request("POST", f"{stubs.url}/tts", 5, json={"text": "hi"})).json()
+
+    with TestClient(app) as client:
+        assert "audio_url" in client.get("/").json()
+        [opened] = upstreams.clients.values()
+        assert not opened.is_closed
+    assert opened.is_closed
+    assert upstreams.clients == {}
@@ -0,0 +1,72 @@
+import asyncio
+import os
+import random
+from contextlib import asynccontextmanager
+import httpx
+
+# Seconds an upstream has to accept a connection, within the call's own timeout
+CONNECT_TIMEOUT = float(os.getenv("CONNECT_TIMEOUT", 5))
+# Retries of a failed upstream call, the first after about HTTP_BACKOFF seconds and each later one twice as long
+HTTP_RETRIES = int(os.getenv("HTTP_RETRIES", 2))
+HTTP_BACKOFF = float(os.getenv("HTTP_BACKOFF", 0.5))
+# Connections each worker keeps to each upstream host
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", 20))
+# Answers meaning the upstream did not act on the call, and those it may have
+UNHANDLED_STATUSES = {429, 503}
+RETRY_STATUSES = {429, 502, 503, 504}
+
+
+class Upstreams:
+    """Async HTTP clients for the services the gateway calls, one per host, each keeping its connections alive.
+
+    A call that could not connect, or was answered 429 or 503, is retried after a
+    growing, jittered delay. Timeouts, dropped connections, 502 and 504 are only
+    retried for `idempotent` calls, as the upstream may already have acted on them.
+    Give `lifespan` to the app so the clients are closed when it shuts down.
+    """
+
+    def __init__(self, pool_size=HTTP_POOL_SIZE, retries=HTTP_RETRIES, backoff=HTTP_BACKOFF, connect_timeout=CONNECT_TIMEOUT):
+        self.limits = httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size, keepalive_expiry=30)
+        self.retries = retries
+        self.backoff = backoff
+        self.connect_timeout = connect_timeout
+        self.clients = {}
+
+    def client(self, url):
+        url = httpx.URL(url)
+        origin = (url.scheme, url.host, url.port)
+        if origin not in self.clients:
+            self.clients[origin] = httpx.AsyncClient(limits=self.limits)
+        return self.clients[origin]
+
+    async def request(self, method, url, timeout, idempotent=False, **kwargs):
+        """The response to one call, after up to `retries` retries; `timeout` is in seconds per attempt."""
+        client = self.client(url)
+        timeout = httpx.Timeout(timeout, connect=min(self.connect_timeout, timeout))
+        statuses = RETRY_STATUSES if idempotent else UNHANDLED_STATUSES
+        for attempt in range(self.retries + 1):
+            last = attempt == self.retries
+            try:
+                response = await client.request(method, url, timeout=timeout, **kwargs)
+            except (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout):
+                if last:
+                    raise
+            except httpx.TransportError:
+                if last or not idempotent:
+                    raise
+            else:
+                if last or response.status_code not in statuses:
+                    return response
+            await asyncio.sleep(self.backoff * 2 ** attempt * random.uniform(0.5, 1.5))
+
+    async def aclose(self):
+        clients, self.clients = list(self.clients.values()), {}
+        for client in clients:
+            await client.aclose()
+
+    @asynccontextmanager
+    async def lifespan(self, app):
+        try:
+            yield
+        finally:
+            await self.aclose()